@@ -0,0 +1,64 @@
+'''
+parallel_export.py
+
+Benchmarks exporting a large generated tab with measure_utils.export_measures
+across different numbers of processes, against the serial write_measures.
+
+Run from the repository root:
+    python benchmarks/parallel_export.py [number of measures] [max processes]
+
+By default the process count doubles up to the number of CPUs.
+'''
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'modules'))
+import measure_utils
+
+
+def generate_tab(num_measures):
+    '''Repeats the measures of the library tabs until there are
+    `num_measures` of them.'''
+    library = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tab_library', 'low_g')
+    source = []
+    for name in sorted(os.listdir(library)):
+        source.extend(measure_utils.load_tab_from_ascii(os.path.join(library, name)))
+    return [source[i % len(source)] for i in range(num_measures)]
+
+
+def timed(function, *args, **kwargs):
+    start = time.time()
+    function(*args, **kwargs)
+    return time.time() - start
+
+
+def main():
+    num_measures = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    max_processes = int(sys.argv[2]) if len(sys.argv) > 2 else multiprocessing.cpu_count()
+    measures = generate_tab(num_measures)
+    serial_path = tempfile.mkstemp()[1]
+    parallel_path = tempfile.mkstemp()[1]
+    try:
+        serial = timed(measure_utils.write_measures, measures, 4, serial_path)
+        expected = open(serial_path).read()
+        print("{} measures, {:.1f} MB".format(num_measures, len(expected) / 1e6))
+        print("write_measures: {:.2f} s".format(serial))
+        processes = 1
+        while processes <= max_processes:
+            elapsed = timed(measure_utils.export_measures, measures, 4, parallel_path,
+                            processes=processes)
+            if open(parallel_path).read() != expected:
+                raise AssertionError("Output differs with {} processes".format(processes))
+            print("export_measures, {} processes: {:.2f} s ({:.2f}x)".format(
+                    processes, elapsed, serial / elapsed))
+            processes *= 2
+    finally:
+        os.remove(serial_path)
+        os.remove(parallel_path)
+
+
+if __name__ == '__main__':
+    main()
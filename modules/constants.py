@@ -65,4 +65,23 @@ CHORDS = {'A': ['0', '0', '1', '2'],
         'Ab': ['3', '4', '3', '5'],
         'Abm': ['2', '4', '3', '4'],
         'Ab7': ['3', '2', '3', '1'],
-        } 
+        }
+
+
+# Roots in the order their spellings are preferred when several names
+# share a fingering: the usual spelling of each of the 12 notes, then the
+# other enharmonic spellings.
+ROOT_SPELLINGS = ['C', 'C#', 'D', 'Eb', 'E', 'F', 'F#', 'G', 'Ab', 'A', 'Bb', 'B',
+                  'Db', 'D#', 'Gb', 'G#', 'A#', 'B#', 'Cb', 'E#', 'Fb']
+
+def chord_name_order(name):
+    '''Sort key that puts the usual spelling of a chord first, e.g. Bb
+    before A#, following ROOT_SPELLINGS.'''
+    root = name[:2] if len(name) > 1 and name[1] in '#b' else name[:1]
+    return (ROOT_SPELLINGS.index(root), name)
+
+# Reverse index of CHORDS, from fret tuple to all names of that fingering,
+# including enharmonic duplicates such as A# and Bb.
+CHORD_NAMES = {}
+for name in sorted(CHORDS, key=chord_name_order):
+    CHORD_NAMES.setdefault(tuple(CHORDS[name]), []).append(name)
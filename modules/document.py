@@ -0,0 +1,224 @@
+'''
+document.py
+'''
+import copy
+from measure import Measure
+from measure import EditDescriptor
+import measure_utils
+
+EditType = EditDescriptor.EditType
+
+
+class Document():
+    '''A tab being edited: its measures, clipboard and last edit.
+
+    `execute` applies the editing commands of the command line interface,
+    so the same commands can be sent by the interactive prompt or over the
+    tab server.
+    '''
+    def __init__(self, measures=None):
+        self.autospace = True
+        self.clipboard = []
+        self.reset(measures)
+
+    def reset(self, measures=None):
+        if measures:
+            self.measures = measures
+            self.last_edit = None
+        else:
+            self.measures = [Measure()]
+            self.last_edit = EditDescriptor(EditType.INSERT, 0, None, True, True)
+
+    def measure_index(self, token, error="Measure number out of range."):
+        measure_num = int(token)-1
+        if measure_num < 0 or measure_num > len(self.measures) - 1:
+            raise ValueError(error)
+        return measure_num
+
+    def execute(self, command):
+        '''Applies an editing command to the document.
+
+        Args:
+            command: a command string, as typed at the prompt.
+
+        Returns:
+            A message to show the user, or None if the tab was changed and
+            `last_edit` describes the change.
+
+        Raises:
+            ValueError: if the command cannot be applied.
+        '''
+        handler, error = self.dispatch(command)
+        try:
+            return handler(command.split())
+        except Exception as e:
+            raise ValueError("{}: {}".format(error, e))
+
+    def dispatch(self, command):
+        '''Returns the handler for a command and the prefix of its error
+        message.'''
+        if command in ["bar", "b"]:
+            return self.bar, "Error adding measure"
+        elif command.startswith("barline"):
+            return self.barline, "Error inserting barline"
+        elif command.startswith("del barline"):
+            return self.delete_barline, "Error deleting barline"
+        elif command in ["del", "d"]:
+            return self.delete_last, "Error removing last entry"
+        elif command.startswith("insert measure"):
+            return self.insert_measure, "Error inserting measure"
+        elif command.startswith("del measure") or command.startswith("delete measure"):
+            return self.delete_measure, "Error deleting measure"
+        elif command.startswith("copy measure"):
+            return self.copy_measure, "Error copying measure"
+        elif command.startswith("copy range"):
+            return self.copy_range, "Error copying measures"
+        elif command.startswith("paste insert"):
+            return self.paste_insert, "Error pasting measures"
+        elif command == "paste":
+            return self.paste, "Error pasting measures"
+        elif command.startswith("edit"):
+            return self.edit, "Error editing column"
+        elif command.startswith("insert"):
+            return self.insert, "Error inserting column"
+        elif command.startswith("del") or command.startswith("delete"):
+            return self.delete, "Error deleting column"
+        else:
+            return self.append, "Error adding column"
+
+    def bar(self, command):
+        self.measures.append(Measure())
+        self.last_edit = EditDescriptor(EditType.INSERT, len(self.measures) - 1, None, True, False)
+
+    def barline(self, command):
+        if len(command) < 3:
+            raise ValueError("barline command must specify measure number and column index.")
+        measure_num = self.measure_index(command[1])
+        col_num = int(command[2])-1
+        split = measure_utils.split_measure(self.measures[measure_num], col_num)
+        self.measures[measure_num] = split[0]
+        split[1].insert(0, '')
+        self.measures.insert(measure_num+1, split[1])
+        self.last_edit = EditDescriptor(EditType.INSERT, measure_num + 1, [(0, 1)], True, False)
+
+    def delete_barline(self, command):
+        if len(command) < 3:
+            raise ValueError("del barline command must specify measure number.")
+        measure_num = int(command[2])-1
+        if measure_num == 0:
+            raise ValueError("Cannot remove initial barline.")
+        elif measure_num < 0 or measure_num > len(self.measures) - 1:
+            raise ValueError("Measure number out of range.")
+        col_num = len(self.measures[measure_num - 1].columns) - 1
+        deletes_last_col = len(self.measures[measure_num].columns) == 1
+        merged = measure_utils.merge_measures(self.measures[measure_num - 1], self.measures[measure_num])
+        self.measures[measure_num - 1] = merged
+        self.measures.pop(measure_num)
+        self.last_edit = EditDescriptor(EditType.DELETE, measure_num - 1, [(col_num, col_num + 2)], False, deletes_last_col)
+
+    def delete_last(self, command):
+        measures = self.measures
+        if len(measures[-1].columns) <= 1 and len(measures) > 1:
+            measures.pop()
+        elif len(measures[-1].columns) > 1:
+            measures[-1].delete()
+            if self.autospace and len(measures[-1].columns) > 1:
+                measures[-1].delete()
+        cols = len(measures[-1].columns)
+        self.last_edit = EditDescriptor(EditType.DELETE, len(measures) - 1, [(cols - 1, cols)], False, True)
+
+    def insert_measure(self, command):
+        if len(command) < 3:
+            raise ValueError("insert measure requires index argument.")
+        measure_num = self.measure_index(command[2])
+        self.measures.insert(measure_num, Measure())
+        self.last_edit = EditDescriptor(EditType.INSERT, measure_num, None, True, False)
+
+    def delete_measure(self, command):
+        if len(command) < 3:
+            raise ValueError("delete measure requires measure number argument.")
+        measure_num = self.measure_index(command[2])
+        if len(self.measures) == 1:
+            raise ValueError("Cannot delete the only measure.")
+        self.measures.pop(measure_num)
+        if measure_num == 0:
+            self.last_edit = EditDescriptor(EditType.DELETE, 0, [(0, 1)], True, False)
+            return
+        cols = len(self.measures[measure_num-1].columns)
+        self.last_edit = EditDescriptor(EditType.DELETE, measure_num - 1, [(cols - 1, cols)], False, True)
+
+    def copy_measure(self, command):
+        if len(command) < 3:
+            raise ValueError("copy measure requires measure number argument.")
+        measure_num = self.measure_index(command[2])
+        self.clipboard = [copy.deepcopy(self.measures[measure_num])]
+        return "Copied measure {}. Use 'paste' or 'paste insert'.".format(measure_num+1)
+
+    def copy_range(self, command):
+        if len(command) < 4:
+            raise ValueError("copy range requires begin and end range argument.")
+        begin_range = int(command[2])-1
+        end_range = int(command[3])
+        if begin_range < 0 or begin_range > len(self.measures) - 1:
+            raise ValueError("Range begins out of range.")
+        if end_range < 0 or end_range > len(self.measures):
+            raise ValueError("Range ends out of range.")
+        if begin_range + 1 > end_range:
+            raise ValueError("Range specifiers out of order.")
+        self.clipboard = copy.deepcopy(self.measures[begin_range:end_range])
+        return "Copied measures {}-{}. Use 'paste' or 'paste insert'.".format(begin_range+1, end_range)
+
+    def paste_insert(self, command):
+        if len(command) < 3:
+            raise ValueError("paste insert requires index argument.")
+        if len(self.clipboard) == 0:
+            return "Clipboard empty"
+        measure_num = self.measure_index(command[2])
+        self.measures[measure_num:measure_num] = copy.deepcopy(self.clipboard)
+        m_range = (measure_num, measure_num + len(self.clipboard))
+        self.last_edit = EditDescriptor(EditType.INSERT, m_range, None, True, False)
+
+    def paste(self, command):
+        if len(self.clipboard) == 0:
+            return "Clipboard empty"
+        self.measures.extend(copy.deepcopy(self.clipboard))
+        m_range = (len(self.measures) - len(self.clipboard), len(self.measures))
+        self.last_edit = EditDescriptor(EditType.INSERT, m_range, None, True, False)
+
+    def edit(self, command):
+        if len(command) < 3:
+            raise ValueError("edit command requires measure number and column number.")
+        measure_num = self.measure_index(command[1], "Measure number out of range")
+        col_num = int(command[2])-1
+        col = ' '.join(command[3:])
+        self.measures[measure_num].update(col_num, col)
+        self.last_edit = EditDescriptor(EditType.UPDATE, measure_num, [(col_num, col_num+1)])
+
+    def insert(self, command):
+        if len(command) < 3:
+            raise ValueError("insert command requires measure number and column index.")
+        measure_num = self.measure_index(command[1], "Measure number out of range")
+        col_num = int(command[2])-1
+        col = ' '.join(command[3:])
+        self.measures[measure_num].insert(col_num, col)
+        self.last_edit = EditDescriptor(EditType.INSERT, measure_num, [(col_num, col_num+1)])
+
+    def delete(self, command):
+        if len(command) < 3:
+            raise ValueError("delete command requires measure number and column index.")
+        measure_num = self.measure_index(command[1], "Measure number out of range")
+        col_num = int(command[2])-1
+        is_last_col = col_num == len(self.measures[measure_num].columns) - 1
+        is_first_col = col_num == 0
+        self.measures[measure_num].delete(col_num)
+        self.last_edit = EditDescriptor(EditType.DELETE, measure_num, [(col_num-1, col_num+1)], is_first_col, is_last_col)
+
+    def append(self, command):
+        column = ' '.join(command)
+        measures = self.measures
+        measures[-1].append(column)
+        cols = len(measures[-1].columns)
+        self.last_edit = EditDescriptor(EditType.INSERT, len(measures) - 1, [(cols-1, cols)])
+        if self.autospace and column != '' and set(command) != set(['-']):
+            measures[-1].append('')
+            self.last_edit = EditDescriptor(EditType.INSERT, len(measures) - 1, [(cols-1, cols+1)])
@@ -0,0 +1,66 @@
+from document import Document
+from measure import EditDescriptor
+import unittest
+
+EditType = EditDescriptor.EditType
+
+class DocumentTest(unittest.TestCase):
+    def testAppend(self):
+        doc = Document()
+        self.assertIsNone(doc.execute('1 2'))
+        self.assertEqual(len(doc.measures[0].columns), 3)
+        self.assertEqual(doc.measures[0].columns[1].value, ['1', '2', '-', '-'])
+        self.assertEqual(doc.last_edit.column_ranges, [(1, 3)])
+        doc.autospace = False
+        doc.execute('F')
+        self.assertEqual(len(doc.measures[0].columns), 4)
+
+    def testBarlines(self):
+        doc = Document()
+        doc.execute('1')
+        doc.execute('barline 1 2')
+        self.assertEqual(len(doc.measures), 2)
+        self.assertEqual(doc.last_edit.type, EditType.INSERT)
+        doc.execute('del barline 2')
+        self.assertEqual(len(doc.measures), 1)
+        self.assertEqual(doc.last_edit.type, EditType.DELETE)
+
+    def testCopyPaste(self):
+        doc = Document()
+        self.assertEqual(doc.execute('paste'), "Clipboard empty")
+        doc.execute('3')
+        self.assertEqual(doc.execute('copy measure 1'),
+                "Copied measure 1. Use 'paste' or 'paste insert'.")
+        self.assertIsNone(doc.execute('paste'))
+        self.assertEqual(len(doc.measures), 2)
+        self.assertEqual(doc.measures[1].columns[1].value, ['3', '-', '-', '-'])
+        self.assertIsNot(doc.measures[1], doc.measures[0])
+
+    def testDeleteFirstMeasure(self):
+        doc = Document()
+        doc.execute('1')
+        doc.execute('bar')
+        doc.execute('del measure 1')
+        self.assertEqual(len(doc.measures), 1)
+        self.assertEqual(doc.last_edit.measure_range, (0, 1))
+        self.assertEqual(doc.last_edit.column_ranges, [(0, 1)])
+
+    def testErrors(self):
+        doc = Document()
+        with self.assertRaises(ValueError) as context:
+            doc.execute('insert measure 5')
+        self.assertEqual(str(context.exception),
+                "Error inserting measure: Measure number out of range.")
+        with self.assertRaises(ValueError):
+            doc.execute('1 2 3 4 5')
+
+    def testReset(self):
+        doc = Document()
+        doc.execute('bar')
+        doc.reset()
+        self.assertEqual(len(doc.measures), 1)
+        self.assertEqual(doc.last_edit.type, EditType.INSERT)
+
+
+if __name__ == '__main__':
+    unittest.main()
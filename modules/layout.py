@@ -0,0 +1,159 @@
+'''
+layout.py
+'''
+import bisect
+from measure import EditDescriptor
+import os
+import struct
+import sys
+
+
+def terminal_width(default=80):
+    '''Returns the width of the terminal attached to stdout, or `default`
+    if it cannot be determined.'''
+    try:
+        import fcntl
+        import termios
+        packed = fcntl.ioctl(sys.stdout.fileno(), termios.TIOCGWINSZ, '\0' * 8)
+        width = struct.unpack('hhhh', packed)[1]
+        if width > 0:
+            return width
+    except Exception:
+        pass
+    try:
+        return int(os.environ['COLUMNS'])
+    except (KeyError, ValueError):
+        return default
+
+
+class Layout():
+    '''Breaks a list of measures into lines of music.
+
+    Lines are filled greedily in one of three modes: a fixed number of
+    measures per line, as many measures as fit in a width of characters,
+    or as many measures as fit in a number of columns. The rendered width
+    and column count of each measure are cached, so after an edit only the
+    changed measures are measured again and only the lines from the edit
+    up to the first unchanged line break are re-flowed.
+    '''
+    def __init__(self, measures_per_line=None, width=None, columns_per_line=None):
+        if not (measures_per_line or width or columns_per_line):
+            measures_per_line = 4
+        self.set_mode(measures_per_line, width, columns_per_line)
+
+    def set_mode(self, measures_per_line=None, width=None, columns_per_line=None):
+        '''Sets exactly one of `measures_per_line`, `width` (in characters,
+        or 'auto' to follow the terminal) and `columns_per_line`.'''
+        if len([arg for arg in (measures_per_line, width, columns_per_line) if arg]) != 1:
+            raise ValueError("Layout requires exactly one of measures per line, width or columns per line.")
+        for arg in (measures_per_line, columns_per_line):
+            if arg is not None and arg < 1:
+                raise ValueError("Layout size must be positive.")
+        if width is not None and width != 'auto' and width < 1:
+            raise ValueError("Layout size must be positive.")
+        self.measures_per_line = measures_per_line
+        self.width = width
+        self.columns_per_line = columns_per_line
+        self.sizes = []
+        self.breaks = []
+        self.laid_out_width = None
+
+    def describe(self):
+        if self.measures_per_line:
+            return "{} measures per line".format(self.measures_per_line)
+        elif self.columns_per_line:
+            return "{} columns per line".format(self.columns_per_line)
+        elif self.width == 'auto':
+            return "terminal width ({} characters)".format(self.target_width())
+        return "{} characters per line".format(self.width)
+
+    def target_width(self):
+        if self.width == 'auto':
+            return terminal_width()
+        return self.width
+
+    def measure_size(self, measure):
+        '''Returns (width in characters including the opening barline,
+        number of columns) of a measure.'''
+        return (1 + sum(len(column.value[0]) for column in measure.columns),
+                len(measure.columns))
+
+    def fits(self, line_measures, line_width, line_columns, size, width):
+        if line_measures == 0:
+            return True
+        if self.measures_per_line:
+            return line_measures < self.measures_per_line
+        if self.columns_per_line:
+            return line_columns + size[1] <= self.columns_per_line
+        # Leave room for the closing double barline.
+        return line_width + size[0] + 2 <= width
+
+    def flow(self, start, resume, delta):
+        '''Breaks lines greedily from measure `start`. Stops at the first
+        line start found in `resume`, a dict from measure index to index in
+        the old breaks, and reuses the old breaks from there on, shifted by
+        `delta`.'''
+        old_breaks = self.breaks
+        width = self.target_width() if self.width else None
+        breaks = []
+        i = start
+        n = len(self.sizes)
+        while i < n:
+            if i in resume:
+                breaks.extend(b + delta for b in old_breaks[resume[i]:])
+                return breaks
+            breaks.append(i)
+            line_measures = line_width = line_columns = 0
+            while i < n and self.fits(line_measures, line_width, line_columns, self.sizes[i], width):
+                line_measures += 1
+                line_width += self.sizes[i][0]
+                line_columns += self.sizes[i][1]
+                i += 1
+        return breaks
+
+    def reflow(self, measures, begin=0, end=None):
+        '''Updates the layout after measures[begin:end] have changed.
+
+        Args:
+            measures: the full list of Measure objects, after the change.
+            begin: index of the first changed measure.
+            end: index after the last changed measure, in `measures`. If
+              None, the whole layout is recomputed.
+
+        Returns:
+            The list of line start indices, also stored in `breaks`.
+        '''
+        delta = len(measures) - len(self.sizes)
+        width = self.target_width() if self.width else None
+        # Splitting or merging a measure also changes the measure before
+        # the edit, so start one measure early.
+        begin = max(begin - 1, 0)
+        old_end = None if end is None else end - delta
+        if (end is None or width != self.laid_out_width or not self.breaks or
+                end > len(measures) or old_end < begin or old_end > len(self.sizes)):
+            self.sizes = [self.measure_size(measure) for measure in measures]
+            self.breaks = []
+            self.breaks = self.flow(0, {}, 0)
+            self.laid_out_width = width
+            return self.breaks
+
+        self.sizes[begin:old_end] = [self.measure_size(measure) for measure in measures[begin:end]]
+        line = max(bisect.bisect_right(self.breaks, begin) - 1, 0)
+        resume = {}
+        for index in range(len(self.breaks) - 1, line, -1):
+            if self.breaks[index] < old_end:
+                break
+            resume[self.breaks[index] + delta] = index
+        self.breaks = self.breaks[:line] + self.flow(self.breaks[line], resume, delta)
+        return self.breaks
+
+    def update(self, measures, edit=None):
+        '''Updates the layout for the measures changed by an
+        EditDescriptor, or by a list of EditDescriptors, or recomputes it
+        if `edit` is None.'''
+        if not edit:
+            return self.reflow(measures)
+        if isinstance(edit, EditDescriptor):
+            return self.reflow(measures, edit.measure_range[0], edit.measure_range[1])
+        return self.reflow(measures, min(e.measure_range[0] for e in edit),
+                           max(e.measure_range[1] for e in edit))
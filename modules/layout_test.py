@@ -0,0 +1,76 @@
+from document import Document
+from layout import Layout
+from measure import EditDescriptor
+from measure import Measure
+import random
+import unittest
+
+def make_measure(num_columns, token='-'):
+    measure = Measure()
+    measure.delete()
+    for _ in range(num_columns):
+        measure.append(token)
+    return measure
+
+class LayoutTest(unittest.TestCase):
+    def testMeasuresPerLine(self):
+        measures = [make_measure(2) for _ in range(7)]
+        layout = Layout(measures_per_line=3)
+        self.assertEqual(layout.reflow(measures), [0, 3, 6])
+
+    def testWidth(self):
+        # Widths including the opening barline: 3, 5, 3, 9.
+        measures = [make_measure(2), make_measure(4), make_measure(1, '10 10 10 10'), make_measure(8)]
+        layout = Layout(width=12)
+        self.assertEqual(layout.reflow(measures), [0, 2, 3])
+        layout.set_mode(width=1)
+        self.assertEqual(layout.reflow(measures), [0, 1, 2, 3])
+
+    def testColumnsPerLine(self):
+        measures = [make_measure(2), make_measure(4), make_measure(1), make_measure(8)]
+        layout = Layout(columns_per_line=6)
+        self.assertEqual(layout.reflow(measures), [0, 2, 3])
+
+    def testSetModeErrors(self):
+        layout = Layout()
+        with self.assertRaises(ValueError):
+            layout.set_mode(measures_per_line=2, width=80)
+        with self.assertRaises(ValueError):
+            layout.set_mode(columns_per_line=-1)
+
+    def testUpdateWithEditList(self):
+        measures = [make_measure(2) for _ in range(6)]
+        layout = Layout(width=12)
+        layout.update(measures)
+        measures[1] = make_measure(6)
+        measures[4] = make_measure(6)
+        edits = [EditDescriptor(EditDescriptor.EditType.UPDATE, 1, None),
+                 EditDescriptor(EditDescriptor.EditType.UPDATE, 4, None)]
+        self.assertEqual(layout.update(measures, edits), Layout(width=12).reflow(measures))
+
+    def testIncrementalReflowMatchesFullReflow(self):
+        random.seed(0)
+        commands = ['bar', '1', '10 11', '- - 3', 'del', 'insert measure {m}',
+                    'del measure {m}', 'barline {m} {c}', 'del barline {m}',
+                    'insert {m} {c} 12', 'edit {m} {c} 9', 'copy measure {m}', 'paste']
+        for mode in [{'measures_per_line': 3}, {'width': 30}, {'columns_per_line': 7}]:
+            doc = Document()
+            layout = Layout(**mode)
+            layout.update(doc.measures, doc.last_edit)
+            for _ in range(300):
+                m = random.randrange(len(doc.measures))
+                command = random.choice(commands).format(
+                        m=m + 1, c=random.randrange(len(doc.measures[m].columns)) + 1)
+                try:
+                    if doc.execute(command):
+                        continue
+                except ValueError:
+                    layout.update(doc.measures)
+                    continue
+                layout.update(doc.measures, doc.last_edit)
+                full = Layout(**mode)
+                self.assertEqual(layout.breaks, full.reflow(doc.measures), command)
+
+
+if __name__ == '__main__':
+    unittest.main()
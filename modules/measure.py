@@ -6,6 +6,9 @@ import copy
 
 
 class Column():
+    '''A single column of a measure. Columns are never changed after they
+    are created, so they can be shared between measures; Measure.update
+    replaces a column instead.'''
     def __init__(self, column_str='- - - -'):
         self.value = self.normalize(column_str)
     
@@ -31,13 +34,22 @@ class Column():
             raise ValueError("Column tokens must be of equal length.")
         return column
 
-    def update(self, column_str):
-        self.value = self.normalize(column_str)
+    def chord_names(self):
+        '''Returns the names of the chord fingered by this column, most
+        common spelling first, or an empty list if it is not a chord.'''
+        return constants.CHORD_NAMES.get(tuple(self.value), [])
 
 
 class Measure():
-    def __init__(self, column_list=None):
-        if column_list:
+    def __init__(self, column_list=None, share_columns=False):
+        '''If `share_columns`, the Measure takes ownership of `column_list`
+        and shares its Column objects instead of deep copying them. This is
+        safe because Columns are never changed in place; `update` replaces
+        a column (copy-on-write). The caller must not modify `column_list`
+        afterwards.'''
+        if column_list and share_columns:
+            self.columns = column_list
+        elif column_list:
             self.columns = copy.deepcopy(column_list)
         else:
             self.columns = [Column()]
@@ -56,7 +68,7 @@ class Measure():
 
     def update(self, index, column_str):
         self.assert_in_range(index)
-        self.columns[index].update(column_str)
+        self.columns[index] = Column(column_str)
 
     def delete(self, index=None):
         if index:
@@ -20,10 +20,13 @@ class ColumnTest(unittest.TestCase):
         column = Column('1 2 3')
         self.assertEqual(column.value, ['1', '2', '3' ,'-'])
 
-    def testUpdate(self):
-        column = Column()
-        column.update('1 2 3')
-        self.assertEqual(column.value, ['1', '2', '3' ,'-'])
+    def testChordNames(self):
+        self.assertEqual(Column('F').chord_names(), ['F', 'E#'])
+        self.assertEqual(Column('1 1 2 3').chord_names(), ['Bb', 'A#'])
+        self.assertEqual(Column('Bb7').chord_names(), ['Bb7', 'A#7'])
+        self.assertEqual(Column('Db').chord_names(), ['C#', 'Db'])
+        self.assertEqual(Column('D#').chord_names(), ['Eb', 'D#'])
+        self.assertEqual(Column('1 1 1 1').chord_names(), [])
 
 
 class MeasureTest(unittest.TestCase):
@@ -61,6 +64,19 @@ class MeasureTest(unittest.TestCase):
         with self.assertRaises(ValueError, msg="Column index out of range."):
             measure.update(1, '')
 
+    def testShareColumns(self):
+        measure = Measure()
+        measure.append('1')
+        shared = Measure(list(measure.columns), share_columns=True)
+        self.assertIs(shared.columns[1], measure.columns[1])
+        shared.update(1, '2')
+        shared.append('3')
+        self.assertEqual(len(measure.columns), 2)
+        self.assertEqual(shared.columns[1].value, ['2', '-', '-', '-'])
+        self.assertEqual(measure.columns[1].value, ['1', '-', '-', '-'])
+        copied = Measure(measure.columns)
+        self.assertIsNot(copied.columns[1], measure.columns[1])
+
     def testDelete(self):
         measure = Measure()
         measure.delete(0)
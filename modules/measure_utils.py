@@ -4,9 +4,13 @@ measure_utils.py
 from colorama import init
 init()
 from colorama import Fore, Back, Style
+import collections
 import contextlib
 from measure import Measure
 from measure import EditDescriptor
+import multiprocessing
+import cStringIO
+import StringIO
 import sys
 
 @contextlib.contextmanager
@@ -29,6 +33,13 @@ def chunker(seq, size):
     seq = list(enumerate(seq))
     return (seq[pos:pos + size] for pos in xrange(0, len(seq), size))
 
+def break_lines(seq, breaks):
+    '''Divides a sequence into chunks beginning at each index in `breaks`.
+    Enumerates seq before chunking.'''
+    seq = list(enumerate(seq))
+    ends = list(breaks[1:]) + [len(seq)]
+    return (seq[begin:end] for begin, end in zip(breaks, ends))
+
 def split_measure(measure, index):
     '''Splits Measure into two Measures at the given index.
 
@@ -38,18 +49,173 @@ def split_measure(measure, index):
           second measure after splitting.
 
     Returns:
-        A list of 2 Measure objects.
+        A list of 2 Measure objects. Their columns are shared with
+        `measure` rather than copied.
     '''
     if index < 0 or index > len(measure.columns) - 1:
         raise ValueError("Column index out of range.")
-    return [Measure(measure.columns[:index]), Measure(measure.columns[index:])]
+    return [Measure(measure.columns[:index], share_columns=True),
+            Measure(measure.columns[index:], share_columns=True)]
 
 def merge_measures(measure1, measure2):
     '''Merges two measures into a single measure, removing first column
-    of second measure.'''
-    return Measure(measure1.columns + measure2.columns[1:])
+    of second measure. Columns are shared with the input measures rather
+    than copied.'''
+    return Measure(measure1.columns + measure2.columns[1:], share_columns=True)
+
+def falls_within_edit(edit, measure_num, col_num):
+    if measure_num < edit.measure_range[0]:
+        return False
+    if measure_num >= edit.measure_range[1]:
+        return False
+    if not edit.column_ranges:
+        return True
+    m = measure_num - edit.measure_range[0]
+    if col_num < edit.column_ranges[m][0]:
+        return False
+    if col_num >= edit.column_ranges[m][1]:
+        return False
+    return True
+
+def edit_color(edit):
+    if edit.type == EditDescriptor.EditType.INSERT:
+        return Fore.GREEN
+    elif edit.type == EditDescriptor.EditType.UPDATE:
+        return Fore.YELLOW
+    elif edit.type == EditDescriptor.EditType.DELETE:
+        return Fore.RED
+    else:
+        raise ValueError("Unknown edit type")
+
+def index_edits(edits):
+    '''Maps each measure number to the list of edits that cover it, so
+    that coloring a column only looks at the edits of its own measure.'''
+    edit_index = {}
+    for edit in edits:
+        for measure_num in xrange(*edit.measure_range):
+            edit_index.setdefault(measure_num, []).append(edit)
+    return edit_index
+
+def get_color(edit_index, measure_num, column_num):
+    if not edit_index:
+        return ''
+    for edit in edit_index.get(measure_num, ()):
+        if falls_within_edit(edit, measure_num, column_num):
+            return edit_color(edit)
+    return Fore.WHITE
 
-def write_measures(measures, measures_per_line, filename=None, last_edit=None):
+def get_barline_color(edit_index, measures, measure_num):
+    '''Color of the barline that begins the given measure.'''
+    if not edit_index:
+        return ''
+    # Only edits covering the previous measure can end at this barline.
+    for edit in edit_index.get(measure_num - 1, ()):
+        if measure_num == edit.measure_range[1] and edit.last_barline:
+            return get_color(edit_index, measure_num - 1, len(measures[measure_num - 1].columns) - 1)
+    for edit in edit_index.get(measure_num, ()):
+        if falls_within_edit(edit, measure_num, 0):
+            if measure_num == edit.measure_range[0] and not edit.first_barline:
+                return Fore.WHITE
+            return edit_color(edit)
+    return Fore.WHITE
+
+def ends_without_barline(edit_index, measure_num):
+    for edit in edit_index.get(measure_num, ()):
+        if measure_num == edit.measure_range[1] - 1 and not edit.last_barline:
+            return True
+    return False
+
+def chord_lines(measure_group):
+    '''Returns lines naming the chords in a line of music, aligned with
+    their columns. Each name goes on the first line where it is at least
+    one space clear of the name before it, so names that would run into
+    each other are stacked on extra lines rather than left out.'''
+    lines = []
+    pos = 0
+    for measure_num, measure in measure_group:
+        pos += 1  # Barline.
+        for column in measure.columns:
+            names = column.chord_names()
+            if names:
+                for index, line in enumerate(lines):
+                    if pos > len(line):
+                        break
+                else:
+                    index = len(lines)
+                    lines.append('')
+                lines[index] += ' ' * (pos - len(lines[index])) + names[0]
+            pos += len(column.value[0])
+    return lines
+
+def chord_progression(measures):
+    '''Lists the chords of a tab in order, in one pass over its columns.
+    A chord repeated in consecutive chord columns is listed once.
+
+    Returns:
+        A list of (measure index, chord name) pairs.
+    '''
+    progression = []
+    last_name = None
+    for measure_num, measure in enumerate(measures):
+        for column in measure.columns:
+            names = column.chord_names()
+            if names and names[0] != last_name:
+                progression.append((measure_num, names[0]))
+                last_name = names[0]
+    return progression
+
+def write_line_group(fh, measures, measure_group, edit_index=None, chord_names=False):
+    '''Writes one line of music.
+
+    Args:
+        fh: file to write to.
+        measures: the full list of Measure objects.
+        measure_group: list of (measure number, Measure) pairs on this
+          line, as produced by `chunker`.
+        edit_index: EditDescriptors to highlight, as returned by
+          `index_edits`.
+        chord_names: if True, names chord columns above the staff.
+    '''
+    edit_index = edit_index or {}
+    fh.write(str(measure_group[0][0]+1))  # Write measure number.
+    fh.write('\n')
+    if chord_names:
+        for line in chord_lines(measure_group):
+            fh.write((Fore.WHITE if edit_index else '') + line + '\n')
+    for row in range(4):  # Measures are 4 rows tall.
+        for measure_num, measure in measure_group:
+            color = get_barline_color(edit_index, measures, measure_num)
+            fh.write(color + '|')
+            for column_num, column in enumerate(measure.columns):
+                color = get_color(edit_index, measure_num, column_num)
+                fh.write(color + column.value[row])
+        if ends_without_barline(edit_index, measure_num):
+            color = Fore.WHITE
+        if measure_num == len(measures)-1:
+            fh.write(color + '||')
+        else:
+            fh.write(color + '|')
+        fh.write('\n')
+    fh.write('\n')
+
+def render_line_groups(measures, measures_per_line, begin=0, end=None):
+    '''Renders lines of music [begin, end) as plain text.
+
+    Returns:
+        A list of strings, one per line of music, in the format written
+        by `write_measures` to a file.
+    '''
+    rendered = []
+    stop = len(measures) if end is None else min(end * measures_per_line, len(measures))
+    for start in xrange(begin * measures_per_line, stop, measures_per_line):
+        measure_group = zip(xrange(start, stop), measures[start:start + measures_per_line])
+        out = StringIO.StringIO()
+        write_line_group(out, measures, measure_group)
+        rendered.append(out.getvalue())
+    return rendered
+
+def write_measures(measures, measures_per_line, filename=None, last_edit=None, breaks=None,
+        chord_names=False):
     '''Prints list of measures in a human-readable format.
 
     Adds barlines between measures, measure numbers, double barline at
@@ -59,89 +225,149 @@ def write_measures(measures, measures_per_line, filename=None, last_edit=None):
         measures: A list of Measure objects.
         measures_per_line: prints this many measures per line of music.
         filename: File to write to. Prints to sys.stdout if None.
+        last_edit: EditDescriptor to highlight, or a list of
+          EditDescriptors to highlight several spans at once.
+        breaks: indices of the measures that begin each line of music,
+          e.g. from a Layout. Overrides `measures_per_line`.
+        chord_names: if True, names chord columns above the staff. The
+          names are ignored when the tab is loaded again.
     '''
-    if filename is not None:
-        last_edit = None
-
-    def falls_within_last_edit(measure_num, col_num):
-        if not last_edit:
-            return False
-        if measure_num < last_edit.measure_range[0]:
-            return False
-        if measure_num >= last_edit.measure_range[1]:
-            return False
-        if not last_edit.column_ranges:
-            return True
-        m = measure_num - last_edit.measure_range[0]
-        if col_num < last_edit.column_ranges[m][0]:
-            return False
-        if col_num >= last_edit.column_ranges[m][1]:
-            return False
-        return True
+    if filename is not None or not last_edit:
+        edits = []
+    elif isinstance(last_edit, EditDescriptor):
+        edits = [last_edit]
+    else:
+        edits = list(last_edit)
 
-    def get_color(measure_num, column_num):
-        if not last_edit:
-            return ''
-        if falls_within_last_edit(measure_num, column_num):
-            if last_edit.type == EditDescriptor.EditType.INSERT:
-                return Fore.GREEN
-            elif last_edit.type == EditDescriptor.EditType.UPDATE:
-                return Fore.YELLOW
-            elif last_edit.type == EditDescriptor.EditType.DELETE:
-                return Fore.RED
-            else:
-                raise ValueError("Unknown edit type")
-        else:
-            return Fore.WHITE
+    if breaks is not None:
+        measure_groups = break_lines(measures, breaks)
+    else:
+        measure_groups = chunker(measures, measures_per_line)
 
+    edit_index = index_edits(edits)
     with smart_open(filename) as fh: 
-        for measure_group in chunker(measures, measures_per_line):
-            fh.write(str(measure_group[0][0]+1))  # Write measure number.
-            fh.write('\n')
-            for row in range(4):  # Measures are 4 rows tall.
-                for measure_num, measure in measure_group:
-                    color = get_color(measure_num, 0)
-                    if last_edit and measure_num == last_edit.measure_range[0] and not last_edit.first_barline:
-                        color = Fore.WHITE
-                    if last_edit and measure_num == last_edit.measure_range[1] and last_edit.last_barline:
-                        color = get_color(measure_num - 1, len(measures[measure_num - 1].columns) - 1)
-                    fh.write(color + '|')
-                    for column_num, column in enumerate(measure.columns):
-                        color = get_color(measure_num, column_num)
-                        fh.write(color + column.value[row])
-                if last_edit and measure_num == last_edit.measure_range[1] - 1 and not last_edit.last_barline:
-                    color = Fore.WHITE
-                if measure_num == len(measures)-1:
-                    fh.write(color + '||')
-                elif (measure_num + 1) % measures_per_line == 0:
-                    fh.write(color + '|')
-                fh.write('\n')
-            fh.write('\n')
-        if last_edit:
+        for measure_group in measure_groups:
+            write_line_group(fh, measures, measure_group, edit_index, chord_names)
+        if edits:
             fh.write(Style.RESET_ALL)
 
-def load_tab_from_ascii_lines(lines):
-    '''Loads tab from a list of ascii lines into a list of Measure
-    objects. Lines beginning with '|' must be part of measures, and
-    all other lines are ignored.'''
-    measures = []
+# Tab being exported by the worker processes of `export_measures`.
+export_state = {}
+
+def init_export(measures, chord_names):
+    '''Initializes an `export_measures` worker process. The measures are
+    passed once per process rather than with every batch.'''
+    export_state['measures'] = measures
+    export_state['chord_names'] = chord_names
+
+def render_batch(line_ranges):
+    '''Renders a batch of lines of music of the tab being exported as
+    plain text.
+
+    Args:
+        line_ranges: list of (begin, end) measure ranges, one per line.
+    '''
+    measures = export_state['measures']
+    out = cStringIO.StringIO()
+    for begin, end in line_ranges:
+        measure_group = zip(xrange(begin, end), measures[begin:end])
+        write_line_group(out, measures, measure_group, chord_names=export_state['chord_names'])
+    return out.getvalue()
+
+def export_measures(measures, measures_per_line, filename, breaks=None, chord_names=False,
+        processes=None, lines_per_batch=64):
+    '''Writes measures to a file like `write_measures`, rendering batches
+    of lines of music in a pool of processes.
+
+    The output is identical to `write_measures(measures,
+    measures_per_line, filename, breaks=breaks, chord_names=chord_names)`.
+    Batches are sent as measure ranges only, and at most two batches per
+    process are in flight at a time, so memory use does not grow with the
+    size of the tab.
+
+    Args:
+        processes: number of worker processes. Defaults to the number of
+          CPUs. With 1, batches are rendered in this process.
+        lines_per_batch: lines of music sent to a worker at a time.
+    '''
+    if breaks is None:
+        breaks = xrange(0, len(measures), measures_per_line)
+
+    def batches():
+        batch = []
+        begin = None
+        for end in breaks:
+            if begin is not None:
+                batch.append((begin, end))
+            begin = end
+            if len(batch) == lines_per_batch:
+                yield batch
+                batch = []
+        if begin is not None:
+            batch.append((begin, len(measures)))
+        if batch:
+            yield batch
+
+    processes = processes or multiprocessing.cpu_count()
+    with open(filename, 'w') as fh:
+        if processes == 1:
+            init_export(measures, chord_names)
+            try:
+                for batch in batches():
+                    fh.write(render_batch(batch))
+            finally:
+                export_state.clear()
+            return
+        pool = multiprocessing.Pool(processes, init_export, (measures, chord_names))
+        try:
+            pending = collections.deque()
+            for batch in batches():
+                pending.append(pool.apply_async(render_batch, (batch,)))
+                if len(pending) >= 2 * processes:
+                    fh.write(pending.popleft().get())
+            while pending:
+                fh.write(pending.popleft().get())
+        finally:
+            pool.terminate()
+            pool.join()
+
+def split_line_groups(lines):
+    '''Splits a list of ascii lines into line groups. Each line group is
+    a tuple of the 4 lines of one line of music. Lines beginning with '|'
+    must be part of measures, and all other lines are ignored.'''
+    line_groups = []
     i = 0
     while i < len(lines):
         if lines[i].startswith('|'):
-            tab_line = []
-            for _ in range(4):
-                tab_line.append(filter(None, lines[i].strip().split('|')))
-                i += 1
-            for m in range(len(tab_line[0])):
-                measure = Measure()
-                measure.delete()
-                for c in range(len(tab_line[0][m])):
-                    measure.append(' '.join([tab_line[l][m][c] for l in range(4)]))
-                measures.append(measure)
+            line_groups.append(tuple(lines[i:i + 4]))
+            i += 4
         else:
             i += 1
+    return line_groups
+
+def load_line_group(line_group):
+    '''Loads a single line group (4 ascii lines) into a list of Measure
+    objects.'''
+    tab_line = []
+    for line in line_group:
+        tab_line.append(filter(None, line.strip().split('|')))
+    measures = []
+    for m in range(len(tab_line[0])):
+        measure = Measure()
+        measure.delete()
+        for c in range(len(tab_line[0][m])):
+            measure.append(' '.join([tab_line[l][m][c] for l in range(4)]))
+        measures.append(measure)
+    return measures
+
+def load_tab_from_ascii_lines(lines):
+    '''Loads tab from a list of ascii lines into a list of Measure
+    objects. Lines beginning with '|' must be part of measures, and
+    all other lines are ignored.'''
+    measures = []
+    for line_group in split_line_groups(lines):
+        measures.extend(load_line_group(line_group))
     return measures
-            
 
 def load_tab_from_ascii(filename):
     '''Loads ascii tab from file into a list of Measure objects. Lines
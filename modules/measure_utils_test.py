@@ -1,7 +1,12 @@
+from colorama import Fore
+from measure import EditDescriptor
 from measure import Measure
 import measure_utils
 import os
+import StringIO
+import sys
 import tempfile
+import time
 import unittest
 
 class MeasureUtilsTest(unittest.TestCase):
@@ -26,6 +31,15 @@ class MeasureUtilsTest(unittest.TestCase):
         with self.assertRaises(ValueError, msg="Column index out of range."):
             measure_utils.split_measure(measure, 2)
 
+    def testSplitMeasureCopyOnWrite(self):
+        measure = Measure()
+        measure.append('1 1 1 1')
+        measures = measure_utils.split_measure(measure, 1)
+        self.assertIs(measures[1].columns[0], measure.columns[1])
+        measures[1].update(0, '2')
+        self.assertEqual(measure.columns[1].value, ['1', '1', '1', '1'])
+        self.assertEqual(measures[1].columns[0].value, ['2', '-', '-', '-'])
+
     def testMergeMeasures(self):
         measure1 = Measure()
         measure2 = Measure()
@@ -52,6 +66,122 @@ class MeasureUtilsTest(unittest.TestCase):
         self.assertEqual(contents,
                 '''1\n|-|-1|\n|-|-0|\n|-|-0|\n|-|-0|\n\n3\n|0||\n|1||\n|0||\n|2||\n\n''')
 
+    def testWriteMeasuresMultipleEdits(self):
+        measure1 = Measure()
+        measure1.append('1')
+        measure2 = Measure()
+        measure2.append('2')
+        edits = [EditDescriptor(EditDescriptor.EditType.INSERT, 0, [(1, 2)]),
+                 EditDescriptor(EditDescriptor.EditType.UPDATE, 1, [(1, 2)])]
+        out = StringIO.StringIO()
+        stdout = sys.stdout
+        sys.stdout = out
+        try:
+            measure_utils.write_measures([measure1, measure2], 2, last_edit=edits)
+        finally:
+            sys.stdout = stdout
+        first_row = out.getvalue().splitlines()[1]
+        self.assertEqual(first_row, Fore.WHITE + '|' + Fore.WHITE + '-' + Fore.GREEN + '1' +
+                Fore.WHITE + '|' + Fore.WHITE + '-' + Fore.YELLOW + '2' + Fore.WHITE + '||')
+
+    def testRenderLineGroups(self):
+        measures = []
+        for i in range(5):
+            measure = Measure()
+            measure.append(str(i))
+            measures.append(measure)
+        rendered = measure_utils.render_line_groups(measures, 2)
+        self.assertEqual(len(rendered), 3)
+        self.assertEqual(rendered[2], '5\n|-4||\n|--||\n|--||\n|--||\n\n')
+        self.assertEqual(measure_utils.render_line_groups(measures, 2, 1, 2), rendered[1:2])
+        self.assertEqual(measure_utils.render_line_groups(measures, 2, 1), rendered[1:])
+
+    def testIndexEdits(self):
+        insert = EditDescriptor(EditDescriptor.EditType.INSERT, (0, 2), None)
+        update = EditDescriptor(EditDescriptor.EditType.UPDATE, 1, [(0, 1)])
+        edit_index = measure_utils.index_edits([insert, update])
+        self.assertEqual(edit_index, {0: [insert], 1: [insert, update]})
+
+    def testWriteMeasuresManyEdits(self):
+        # A diff of a large tab highlights thousands of spans at once.
+        measures = []
+        for _ in range(10000):
+            measure = Measure()
+            measure.append('1')
+            measure.append('2')
+            measures.append(measure)
+        edits = [EditDescriptor(EditDescriptor.EditType.UPDATE, m, [(1, 2)])
+                 for m in range(0, 10000, 3)]
+        out = StringIO.StringIO()
+        stdout = sys.stdout
+        sys.stdout = out
+        start = time.time()
+        try:
+            measure_utils.write_measures(measures, 4, last_edit=edits)
+        finally:
+            sys.stdout = stdout
+        self.assertLess(time.time() - start, 10)
+        first_row = out.getvalue().splitlines()[1]
+        self.assertTrue(first_row.startswith(Fore.WHITE + '|' + Fore.WHITE + '-' +
+                Fore.YELLOW + '1' + Fore.WHITE + '2' + Fore.WHITE + '|'))
+
+    def testChordLines(self):
+        measure = Measure()
+        for column in ['Am', '-', 'F', '-', 'C', 'G', 'F']:
+            measure.append(column)
+        self.assertEqual(measure_utils.chord_lines([(0, measure)]), ['  Am  C F', '    F  G'])
+        self.assertEqual(measure_utils.chord_lines([(0, Measure())]), [])
+
+    def testChordProgression(self):
+        measure1 = Measure()
+        measure1.append('C')
+        measure1.append('C')
+        measure1.append('1')
+        measure2 = Measure()
+        measure2.update(0, 'Am')
+        measure2.append('F')
+        self.assertEqual(measure_utils.chord_progression([measure1, measure2]),
+                [(0, 'C'), (1, 'Am'), (1, 'F')])
+
+    def testWriteMeasuresChordNames(self):
+        measure1 = Measure()
+        measure1.append('Am')
+        measure1.append('G7')
+        measure2 = Measure()
+        measure2.update(0, '10 10 10 10')
+        measure2.append('C')
+        measures = [measure1, measure2]
+
+        outfile_path = tempfile.mkstemp()[1]
+        try:
+            measure_utils.write_measures(measures, 2, outfile_path, chord_names=True)
+            contents = open(outfile_path).read()
+            loaded = measure_utils.load_tab_from_ascii(outfile_path)
+        finally:
+            os.remove(outfile_path)
+        self.assertEqual(contents,
+                '''1\n  Am   C\n   G7\n|-02|103||\n|-01|100||\n|-02|100||\n|-20|100||\n\n''')
+        self.assertEqual(len(loaded), 2)
+        self.assertEqual(loaded[0].columns[1].value, ['0', '0', '0', '2'])
+
+    def testExportMeasures(self):
+        library = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tab_library', 'low_g')
+        measures = measure_utils.load_tab_from_ascii(os.path.join(library, 'i_lava_you.txt'))
+        serial_path = tempfile.mkstemp()[1]
+        parallel_path = tempfile.mkstemp()[1]
+        try:
+            measure_utils.write_measures(measures, 3, serial_path, chord_names=True)
+            for processes in [1, 2]:
+                measure_utils.export_measures(measures, 3, parallel_path, chord_names=True,
+                        processes=processes, lines_per_batch=2)
+                self.assertEqual(open(parallel_path).read(), open(serial_path).read())
+            measure_utils.write_measures(measures, None, serial_path, breaks=[0, 5, 6])
+            measure_utils.export_measures(measures, None, parallel_path, breaks=[0, 5, 6], processes=2)
+            self.assertEqual(open(parallel_path).read(), open(serial_path).read())
+        finally:
+            os.remove(serial_path)
+            os.remove(parallel_path)
+
     def testLoadFromAscii(self):
         test_ascii = '''
 This is the title.
@@ -0,0 +1,107 @@
+'''
+tab_cache.py
+'''
+import collections
+import cPickle
+import hashlib
+from measure import Measure
+import measure_utils
+import os
+import tempfile
+
+
+class TabCache():
+    '''Cache of tabs parsed by `measure_utils.load_tab_from_ascii`.
+
+    Entries are keyed by absolute path and are valid while the file's size
+    and mtime are unchanged. The in-memory cache evicts the least recently
+    used tabs once the total size of their files exceeds `max_bytes`. If
+    `cache_dir` is given, parsed tabs are also pickled there, so they
+    survive between runs.
+    '''
+    def __init__(self, max_bytes=16 * 1024 * 1024, cache_dir=None):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.entries = collections.OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def load(self, filename):
+        '''Loads a tab, from the cache if possible.
+
+        Returns:
+            A new list of Measure objects. The measures are copies, so
+            editing them does not change the cache. Their columns are
+            shared with the cache, which is safe because Columns are never
+            changed in place.
+        '''
+        path = os.path.abspath(filename)
+        stat = os.stat(path)
+        signature = (stat.st_size, stat.st_mtime)
+
+        entry = self.entries.pop(path, None)
+        if entry and entry[0] == signature:
+            self.hits += 1
+            measures = entry[1]
+        else:
+            if entry:
+                self.total_bytes -= entry[0][0]
+            measures = self.load_from_disk(path, signature)
+            if measures is not None:
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+                measures = measure_utils.load_tab_from_ascii(path)
+                self.save_to_disk(path, signature, measures)
+            self.total_bytes += signature[0]
+        self.entries[path] = (signature, measures)
+        self.evict()
+        return [Measure(list(measure.columns), share_columns=True) for measure in measures]
+
+    def evict(self):
+        # Always keep the most recently used tab, even if it is too large.
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            signature, measures = self.entries.popitem(last=False)[1]
+            self.total_bytes -= signature[0]
+
+    def disk_path(self, path):
+        return os.path.join(self.cache_dir, hashlib.sha1(path).hexdigest() + '.pickle')
+
+    def load_from_disk(self, path, signature):
+        '''Returns the pickled measures for `path`, or None if there are none
+        or they were parsed from a different version of the file.'''
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self.disk_path(path), 'rb') as f:
+                cached_path, cached_signature, measures = cPickle.load(f)
+        except Exception:
+            return None
+        if cached_path != path or cached_signature != signature:
+            return None
+        return measures
+
+    def save_to_disk(self, path, signature, measures):
+        if not self.cache_dir:
+            return
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        # Write to a temporary file first so readers never see a partial pickle.
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir)
+        with os.fdopen(fd, 'wb') as f:
+            cPickle.dump((path, signature, measures), f, cPickle.HIGHEST_PROTOCOL)
+        os.rename(temp_path, self.disk_path(path))
+
+    def clear(self):
+        '''Empties the in-memory cache. The disk cache is kept.'''
+        self.entries.clear()
+        self.total_bytes = 0
+
+    def stats(self):
+        return {'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses}
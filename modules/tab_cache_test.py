@@ -0,0 +1,86 @@
+from tab_cache import TabCache
+import os
+import shutil
+import tempfile
+import unittest
+
+TAB = '''1
+|-1-|-2-||
+|---|---||
+|---|---||
+|---|---||
+'''
+
+class TabCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = self.write('song.txt', TAB, 1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, contents, mtime):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w') as f:
+            f.write(contents)
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def testHitsAndMisses(self):
+        cache = TabCache()
+        measures = cache.load(self.path)
+        self.assertEqual(len(measures), 2)
+        cache.load(self.path)
+        self.assertEqual(cache.stats(), {'entries': 1, 'bytes': len(TAB), 'hits': 1,
+                                         'disk_hits': 0, 'misses': 1})
+
+    def testModifiedFile(self):
+        cache = TabCache()
+        cache.load(self.path)
+        self.write('song.txt', TAB.replace('-2-', '-3-'), 2000)
+        measures = cache.load(self.path)
+        self.assertEqual(measures[1].columns[1].value, ['3', '-', '-', '-'])
+        self.assertEqual(cache.stats()['misses'], 2)
+        self.assertEqual(cache.stats()['bytes'], len(TAB))
+
+    def testLoadReturnsCopies(self):
+        cache = TabCache()
+        measures = cache.load(self.path)
+        measures[0].update(1, '5')
+        measures[0].append('6')
+        measures = cache.load(self.path)
+        self.assertEqual(len(measures[0].columns), 3)
+        self.assertEqual(measures[0].columns[1].value, ['1', '-', '-', '-'])
+
+    def testEviction(self):
+        other = self.write('other.txt', TAB, 1000)
+        cache = TabCache(max_bytes=len(TAB) * 2 - 1)
+        cache.load(self.path)
+        cache.load(other)
+        self.assertEqual(cache.stats()['entries'], 1)
+        cache.load(other)
+        cache.load(self.path)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 3)
+
+    def testDiskCache(self):
+        cache_dir = os.path.join(self.dir, 'cache')
+        TabCache(cache_dir=cache_dir).load(self.path)
+        cache = TabCache(cache_dir=cache_dir)
+        measures = cache.load(self.path)
+        self.assertEqual(measures[1].columns[1].value, ['2', '-', '-', '-'])
+        self.assertEqual(cache.stats()['disk_hits'], 1)
+        self.write('song.txt', TAB, 2000)
+        other = TabCache(cache_dir=cache_dir)
+        other.load(self.path)
+        self.assertEqual(other.stats()['misses'], 1)
+        self.assertEqual(other.stats()['disk_hits'], 0)
+        signature = (len(TAB), os.stat(self.path).st_mtime)
+        self.assertIsNotNone(other.load_from_disk(os.path.abspath(self.path), signature))
+        cache.clear()
+        cache.load(self.path)
+        self.assertEqual(cache.stats()['disk_hits'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,283 @@
+'''
+tab_diff.py
+'''
+import bisect
+from measure import EditDescriptor
+
+EditType = EditDescriptor.EditType
+
+
+# Edit distance beyond which `myers_diff` stops searching for a shortest
+# edit script. The search takes O((N + M) * D) time and O(D^2) memory.
+MAX_EDIT_DISTANCE = 1000
+
+
+def myers_diff(a, b, max_d=MAX_EDIT_DISTANCE):
+    '''Computes a shortest edit script between two sequences using Myers'
+    O(ND) algorithm.
+
+    Args:
+        a: the old sequence. Elements must be hashable.
+        b: the new sequence.
+        max_d: if the sequences differ by more than this many insertions
+          and deletions, gives up on a shortest edit script. Elements that
+          occur exactly once in both sequences are then matched up, as in
+          patience diff, and the sequences are diffed between them. What
+          cannot be matched up is reported as a replacement.
+
+    Returns:
+        A list of opcodes (tag, i1, i2, j1, j2) in the style of difflib,
+        where tag is one of 'equal', 'replace', 'delete' or 'insert' and
+        a[i1:i2] becomes b[j1:j2].
+    '''
+    steps = diff_steps(a, b, max_d)
+
+    # Group steps into opcodes. Adjacent deletions and insertions are
+    # reported together as a replacement.
+    opcodes = []
+    i = j = 0
+    s = 0
+    while s < len(steps):
+        i1, j1 = i, j
+        if steps[s] == '=':
+            while s < len(steps) and steps[s] == '=':
+                i += 1
+                j += 1
+                s += 1
+            opcodes.append(('equal', i1, i, j1, j))
+            continue
+        while s < len(steps) and steps[s] != '=':
+            if steps[s] == '-':
+                i += 1
+            else:
+                j += 1
+            s += 1
+        if i > i1 and j > j1:
+            tag = 'replace'
+        elif i > i1:
+            tag = 'delete'
+        else:
+            tag = 'insert'
+        opcodes.append((tag, i1, i, j1, j))
+    return opcodes
+
+
+def diff_steps(a, b, max_d):
+    '''Returns an edit script for `myers_diff` as a list of steps, one per
+    element: '=' for a match, '-' for a deletion from a and '+' for an
+    insertion from b.'''
+    n, m = len(a), len(b)
+    prefix = 0
+    while prefix < n and prefix < m and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while (suffix < n - prefix and suffix < m - prefix and
+            a[n - 1 - suffix] == b[m - 1 - suffix]):
+        suffix += 1
+    a_mid = a[prefix:n - suffix]
+    b_mid = b[prefix:m - suffix]
+    steps = shortest_edit_steps(a_mid, b_mid, max_d)
+    if steps is None:
+        steps = anchored_steps(a_mid, b_mid, max_d)
+    return ['='] * prefix + steps + ['='] * suffix
+
+
+def shortest_edit_steps(a, b, max_d):
+    '''Finds a shortest edit script with Myers' greedy search, or returns
+    None if it is longer than `max_d`.'''
+    # v[offset + k] is the furthest x reached on diagonal k. After each d,
+    # only the d + 1 diagonals that d touched are saved, as
+    # frontiers[d][(k + d) / 2].
+    n, m = len(a), len(b)
+    max_d = min(max_d, n + m)
+    offset = max_d + 1
+    v = [0] * (2 * offset + 1)
+    frontiers = []
+    found = False
+    for d in xrange(max_d + 1):
+        for k in xrange(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                found = True
+                break
+        if found:
+            break
+        frontiers.append(v[offset - d:offset + d + 1:2])
+    if not found:
+        return None
+
+    # Walk the frontiers backwards, recording one step per element.
+    steps = []
+    x, y = n, m
+    for d in xrange(len(frontiers), 0, -1):
+        frontier = frontiers[d - 1]
+        k = x - y
+        if k == -d or (k != d and frontier[(k + d - 2) / 2] < frontier[(k + d) / 2]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = frontier[(prev_k + d - 1) / 2]
+        prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            steps.append('=')
+            x -= 1
+            y -= 1
+        steps.append('+' if x == prev_x else '-')
+        x, y = prev_x, prev_y
+    steps.extend('=' * x)
+    steps.reverse()
+    return steps
+
+
+def anchored_steps(a, b, max_d):
+    '''Returns an edit script that matches up the elements occurring
+    exactly once in both sequences and diffs the gaps between them. If
+    there are no such elements, everything is replaced.'''
+    anchors = unique_anchors(a, b)
+    if not anchors:
+        return ['-'] * len(a) + ['+'] * len(b)
+    steps = []
+    i = j = 0
+    for anchor_i, anchor_j in anchors:
+        steps.extend(diff_steps(a[i:anchor_i], b[j:anchor_j], max_d))
+        steps.append('=')
+        i, j = anchor_i + 1, anchor_j + 1
+    steps.extend(diff_steps(a[i:], b[j:], max_d))
+    return steps
+
+
+def unique_anchors(a, b):
+    '''Returns the longest list of index pairs (i, j), increasing in both
+    i and j, with a[i] == b[j] and a[i] occurring exactly once in each
+    sequence.'''
+    a_index = {}
+    for i, element in enumerate(a):
+        a_index[element] = None if element in a_index else i
+    b_index = {}
+    for j, element in enumerate(b):
+        b_index[element] = None if element in b_index else j
+    pairs = [(i, b_index.get(element)) for i, element in enumerate(a)
+             if a_index[element] is not None and b_index.get(element) is not None]
+
+    # Longest increasing subsequence of the j's by patience sorting. tails[t]
+    # is the index in pairs of the smallest j ending an increasing run of
+    # length t + 1.
+    tails = []
+    tail_js = []
+    previous = []
+    for p, (i, j) in enumerate(pairs):
+        t = bisect.bisect_left(tail_js, j)
+        previous.append(tails[t - 1] if t else None)
+        if t == len(tails):
+            tails.append(p)
+            tail_js.append(j)
+        else:
+            tails[t] = p
+            tail_js[t] = j
+    anchors = []
+    p = tails[-1] if tails else None
+    while p is not None:
+        anchors.append(pairs[p])
+        p = previous[p]
+    anchors.reverse()
+    return anchors
+
+
+class Interner():
+    '''Maps hashable keys to small integers so that diffing compares ints
+    instead of nested tuples.'''
+    def __init__(self):
+        self.ids = {}
+
+    def intern(self, key):
+        return self.ids.setdefault(key, len(self.ids))
+
+    def column_ids(self, measure):
+        return [self.intern(tuple(column.value)) for column in measure.columns]
+
+    def measure_id(self, column_ids):
+        return self.intern(tuple(column_ids))
+
+
+def diff_columns(old_ids, new_ids, measure_num):
+    '''Diffs the columns of two versions of one measure.
+
+    Returns:
+        A list of EditDescriptors for measure `measure_num` of the new tab.
+    '''
+    edits = []
+    num_cols = len(new_ids)
+    for tag, i1, i2, j1, j2 in myers_diff(old_ids, new_ids):
+        if tag == 'replace':
+            edits.append(EditDescriptor(EditType.UPDATE, measure_num, [(j1, j2)]))
+        elif tag == 'insert':
+            edits.append(EditDescriptor(EditType.INSERT, measure_num, [(j1, j2)]))
+        elif tag == 'delete':
+            begin, end = max(j1 - 1, 0), min(j1 + 1, num_cols)
+            if begin < end:
+                edits.append(EditDescriptor(EditType.DELETE, measure_num,
+                        [(begin, end)], j1 == 0, j1 == num_cols))
+    return edits
+
+
+def deleted_measures_edit(new_measures, measure_num):
+    '''Marks measures deleted just before `measure_num` of the new tab.'''
+    if measure_num > 0:
+        cols = len(new_measures[measure_num - 1].columns)
+        if cols:
+            return EditDescriptor(EditType.DELETE, measure_num - 1,
+                    [(cols - 1, cols)], False, True)
+    elif new_measures and new_measures[0].columns:
+        return EditDescriptor(EditType.DELETE, 0, [(0, 1)], True, False)
+    return None
+
+
+def diff_tabs(old_measures, new_measures):
+    '''Diffs two tabs, first at the measure level and then at the column
+    level within changed measures.
+
+    Args:
+        old_measures: list of Measure objects.
+        new_measures: list of Measure objects.
+
+    Returns:
+        A list of EditDescriptors against `new_measures`, suitable for
+        passing to `measure_utils.write_measures` as `last_edit`.
+    '''
+    interner = Interner()
+    old_cols = [interner.column_ids(measure) for measure in old_measures]
+    new_cols = [interner.column_ids(measure) for measure in new_measures]
+    old_ids = [interner.measure_id(ids) for ids in old_cols]
+    new_ids = [interner.measure_id(ids) for ids in new_cols]
+
+    edits = []
+    for tag, i1, i2, j1, j2 in myers_diff(old_ids, new_ids):
+        if tag == 'equal':
+            continue
+        paired = min(i2 - i1, j2 - j1)
+        for p in range(paired):
+            edits.extend(diff_columns(old_cols[i1 + p], new_cols[j1 + p], j1 + p))
+        if j2 - j1 > paired:
+            edits.append(EditDescriptor(EditType.INSERT, (j1 + paired, j2), None, True, False))
+        elif i2 - i1 > paired:
+            edit = deleted_measures_edit(new_measures, j1 + paired)
+            if edit:
+                edits.append(edit)
+    return edits
+
+
+def summarize(edits):
+    '''Returns a one-line description of a list of EditDescriptors.'''
+    counts = [0, 0, 0]
+    for edit in edits:
+        counts[edit.type] += 1
+    return "{} insertions, {} updates, {} deletions".format(
+            counts[EditType.INSERT], counts[EditType.UPDATE], counts[EditType.DELETE])
@@ -0,0 +1,110 @@
+from measure import EditDescriptor
+from measure import Measure
+import tab_diff
+import unittest
+
+EditType = EditDescriptor.EditType
+
+def make_measure(*columns):
+    measure = Measure()
+    measure.delete()
+    for column in columns:
+        measure.append(column)
+    return measure
+
+class MyersDiffTest(unittest.TestCase):
+    def testEqual(self):
+        self.assertEqual(tab_diff.myers_diff('abc', 'abc'), [('equal', 0, 3, 0, 3)])
+        self.assertEqual(tab_diff.myers_diff('', ''), [])
+
+    def testOpcodes(self):
+        self.assertEqual(tab_diff.myers_diff('abcd', 'axcdy'),
+                [('equal', 0, 1, 0, 1), ('replace', 1, 2, 1, 2),
+                 ('equal', 2, 4, 2, 4), ('insert', 4, 4, 4, 5)])
+        self.assertEqual(tab_diff.myers_diff('abcd', 'ad'),
+                [('equal', 0, 1, 0, 1), ('delete', 1, 3, 1, 1), ('equal', 3, 4, 1, 2)])
+
+    def testShortestEditScript(self):
+        a = 'abcabba'
+        b = 'cbabac'
+        opcodes = tab_diff.myers_diff(a, b)
+        cost = sum(i2 - i1 + j2 - j1 for tag, i1, i2, j1, j2 in opcodes if tag != 'equal')
+        self.assertEqual(cost, 5)
+        rebuilt = ''.join(b[j1:j2] for tag, i1, i2, j1, j2 in opcodes)
+        self.assertEqual(rebuilt, b)
+
+    def testMaxEditDistance(self):
+        # Past max_d, elements that occur once in both sequences are matched.
+        self.assertEqual(tab_diff.myers_diff('xabcy', 'xbcdy', max_d=1),
+                [('equal', 0, 1, 0, 1), ('delete', 1, 2, 1, 1),
+                 ('equal', 2, 4, 1, 3), ('insert', 4, 4, 3, 4), ('equal', 4, 5, 4, 5)])
+        # With none to match, the middle is replaced.
+        self.assertEqual(tab_diff.myers_diff('xaabby', 'xbbaay', max_d=1),
+                [('equal', 0, 1, 0, 1), ('replace', 1, 5, 1, 5), ('equal', 5, 6, 5, 6)])
+        self.assertEqual(tab_diff.myers_diff('ab', 'abcd', max_d=0),
+                [('equal', 0, 2, 0, 2), ('insert', 2, 2, 2, 4)])
+
+    def testLargeEditDistance(self):
+        a = range(20000)
+        b = [-x - 1 if x % 5 == 0 else x for x in a]
+        opcodes = tab_diff.myers_diff(a, b)
+        changed = [opcode for opcode in opcodes if opcode[0] != 'equal']
+        self.assertEqual(len(changed), 4000)
+        self.assertEqual(changed[0], ('replace', 0, 1, 0, 1))
+        self.assertEqual(changed[-1], ('replace', 19995, 19996, 19995, 19996))
+
+    def testUniqueAnchors(self):
+        self.assertEqual(tab_diff.unique_anchors('abcxd', 'bcaxd'), [(1, 0), (2, 1), (3, 3), (4, 4)])
+        self.assertEqual(tab_diff.unique_anchors('aa', 'aa'), [])
+
+
+class DiffTabsTest(unittest.TestCase):
+    def testLargeTab(self):
+        # One measure inserted at the front and every 7th measure changed is
+        # further apart than MAX_EDIT_DISTANCE, but only those are marked.
+        def numbered_measure(i):
+            return make_measure('{:02d} {:02d} {:02d} {:02d}'.format(
+                    i % 20, i // 20 % 20, i // 400 % 20, i // 8000))
+        old = [numbered_measure(i) for i in range(10000)]
+        new = [numbered_measure(10001)] + [
+                numbered_measure(20000 + i if i % 7 == 3 else i) for i in range(10000)]
+        edits = tab_diff.diff_tabs(old, new)
+        self.assertEqual(len(edits), 1 + 1429)
+        self.assertEqual(edits[0].type, EditType.INSERT)
+        self.assertEqual(edits[0].measure_range, (0, 1))
+        self.assertEqual(edits[1].measure_range, (4, 5))
+        self.assertEqual(edits[2].measure_range, (11, 12))
+
+    def testIdentical(self):
+        old = [make_measure('1', '2'), make_measure('3')]
+        new = [make_measure('1', '2'), make_measure('3')]
+        self.assertEqual(tab_diff.diff_tabs(old, new), [])
+
+    def testInsertedMeasure(self):
+        old = [make_measure('1'), make_measure('3')]
+        new = [make_measure('1'), make_measure('2'), make_measure('3')]
+        edits = tab_diff.diff_tabs(old, new)
+        self.assertEqual(len(edits), 1)
+        self.assertEqual(edits[0].type, EditType.INSERT)
+        self.assertEqual(edits[0].measure_range, (1, 2))
+
+    def testDeletedMeasure(self):
+        old = [make_measure('1'), make_measure('2', '-'), make_measure('3')]
+        new = [make_measure('1', '-'), make_measure('3')]
+        edits = tab_diff.diff_tabs(old, new)
+        self.assertEqual([edit.type for edit in edits], [EditType.INSERT, EditType.DELETE])
+        self.assertEqual(edits[1].measure_range, (0, 1))
+        self.assertEqual(edits[1].column_ranges, [(1, 2)])
+
+    def testChangedColumns(self):
+        old = [make_measure('1', '2', '3', '4')]
+        new = [make_measure('1', '5', '3', '4', '6')]
+        edits = tab_diff.diff_tabs(old, new)
+        self.assertEqual([edit.type for edit in edits], [EditType.UPDATE, EditType.INSERT])
+        self.assertEqual(edits[0].column_ranges, [(1, 2)])
+        self.assertEqual(edits[1].column_ranges, [(4, 5)])
+        self.assertEqual(tab_diff.summarize(edits), "1 insertions, 1 updates, 0 deletions")
+
+
+if __name__ == '__main__':
+    unittest.main()
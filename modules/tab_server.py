@@ -0,0 +1,331 @@
+'''
+tab_server.py
+'''
+from document import Document
+import json
+import measure_utils
+import os
+import Queue
+import socket
+import SocketServer
+import threading
+
+DEFAULT_PORT = 8765
+DEFAULT_MPL = 4
+
+
+def edit_to_dict(edit):
+    '''Converts an EditDescriptor to a JSON-serializable dict.'''
+    if edit is None:
+        return None
+    return {'type': edit.type,
+            'measure_range': list(edit.measure_range),
+            'column_ranges': [list(r) for r in edit.column_ranges] if edit.column_ranges else None,
+            'first_barline': edit.first_barline,
+            'last_barline': edit.last_barline}
+
+
+class DocumentSession():
+    '''A document shared by the clients of a TabServer.
+
+    Commands are applied one at a time under the session lock, and each
+    change is given the next sequence number and queued for every
+    subscriber before the lock is released, so every subscriber sees the
+    changes in the same order. Subscribers write their queues to the
+    network from their own threads, so a slow client never holds the lock.
+    '''
+    def __init__(self, name, measures=None, measures_per_line=DEFAULT_MPL):
+        self.name = name
+        self.doc = Document(measures)
+        self.mpl = measures_per_line
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.subscribers = []
+
+    def num_groups(self):
+        return (len(self.doc.measures) + self.mpl - 1) // self.mpl
+
+    def snapshot(self):
+        '''Returns the full rendered document. Callers must hold the lock.'''
+        return {'doc': self.name,
+                'seq': self.seq,
+                'first_group': 0,
+                'groups': measure_utils.render_line_groups(self.doc.measures, self.mpl),
+                'num_groups': self.num_groups()}
+
+    def changed_groups(self, num_measures):
+        '''Returns the range [begin, end) of lines of music changed by the
+        last edit. If the number of measures changed, every line from the
+        edit onwards is shifted, so end is None.'''
+        edit = self.doc.last_edit
+        if edit is None:
+            return 0, None
+        # Splitting or merging a measure also changes the measure before
+        # the edit, which may end the previous line.
+        begin = max(0, edit.measure_range[0] - 1) // self.mpl
+        if len(self.doc.measures) != num_measures:
+            return begin, None
+        return begin, (edit.measure_range[1] - 1) // self.mpl + 1
+
+    def execute(self, command):
+        '''Applies a command and broadcasts the lines it changed.
+
+        A command that fails may still have changed the document, so a
+        failure also takes the next sequence number and broadcasts the
+        whole document, with 'edit' set to None, before re-raising.
+        '''
+        with self.lock:
+            num_measures = len(self.doc.measures)
+            try:
+                message = self.doc.execute(command)
+            except Exception:
+                self.seq += 1
+                self.broadcast(command, None, 0, None)
+                raise
+            if message:
+                return {'seq': self.seq, 'message': message}
+            self.seq += 1
+            begin, end = self.changed_groups(num_measures)
+            self.broadcast(command, self.doc.last_edit, begin, end)
+            return {'seq': self.seq}
+
+    def broadcast(self, command, edit, begin, end):
+        '''Sends an edit event with lines [begin, end) to the subscribers.
+        Callers must hold the lock.'''
+        event = {'event': 'edit',
+                 'doc': self.name,
+                 'seq': self.seq,
+                 'command': command,
+                 'edit': edit_to_dict(edit),
+                 'first_group': begin,
+                 'groups': measure_utils.render_line_groups(self.doc.measures, self.mpl, begin, end),
+                 'num_groups': self.num_groups()}
+        for subscriber in list(self.subscribers):
+            if not subscriber.send(event):
+                self.subscribers.remove(subscriber)
+
+    def subscribe(self, subscriber):
+        with self.lock:
+            if subscriber not in self.subscribers:
+                self.subscribers.append(subscriber)
+            return self.snapshot()
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+
+
+class TabRequestHandler(SocketServer.StreamRequestHandler):
+    '''Handles one client connection.
+
+    The protocol is newline-delimited JSON. Each request is an object with
+    an 'op' field, an optional 'id' that is echoed in the response, and
+    the op's arguments. Responses have 'ok' set to true, or false with an
+    'error' message. Subscribed connections also receive 'edit' events.
+    '''
+    # Messages are small and latency matters more than throughput.
+    disable_nagle_algorithm = True
+    # Messages waiting to be written before a subscriber is dropped.
+    outbox_size = 1024
+
+    def setup(self):
+        SocketServer.StreamRequestHandler.setup(self)
+        self.sessions = []
+        self.closed = False
+        self.outbox = Queue.Queue(self.outbox_size)
+        self.writer = threading.Thread(target=self.write_loop)
+        self.writer.daemon = True
+        self.writer.start()
+
+    def write_loop(self):
+        '''Writes queued messages to the client until `finish` queues None.
+        After a write fails, the rest are discarded.'''
+        for data in iter(self.outbox.get, None):
+            if self.closed:
+                continue
+            try:
+                self.wfile.write(data)
+                self.wfile.flush()
+            except (socket.error, ValueError):
+                self.closed = True
+
+    def send(self, message, block=False):
+        '''Queues a message for the client. Returns False if the connection
+        has been closed, or if `block` is False and the client has fallen
+        too far behind, in which case the connection is shut down.'''
+        if self.closed:
+            return False
+        try:
+            self.outbox.put(json.dumps(message) + '\n', block)
+            return True
+        except Queue.Full:
+            self.closed = True
+            try:
+                self.request.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            return False
+
+    def handle(self):
+        try:
+            self.read_requests()
+        except socket.error:
+            pass  # The client has gone away.
+
+    def read_requests(self):
+        for line in iter(self.rfile.readline, ''):
+            if not line.strip():
+                continue
+            request_id = None
+            try:
+                request = json.loads(line)
+                request_id = request.get('id')
+                response = self.dispatch(request)
+                response['ok'] = True
+            except Exception as e:
+                response = {'ok': False, 'error': str(e)}
+            response['id'] = request_id
+            # Responses wait for room in the queue rather than dropping
+            # the client, which only slows down this connection.
+            if not self.send(response, block=True):
+                break
+
+    def finish(self):
+        for session in self.sessions:
+            session.unsubscribe(self)
+        self.outbox.put(None)
+        self.writer.join()
+        try:
+            SocketServer.StreamRequestHandler.finish(self)
+        except socket.error:
+            pass
+
+    def dispatch(self, request):
+        op = request.get('op')
+        if op == 'open':
+            session = self.server.open_session(request['doc'], request.get('filename'))
+            with session.lock:
+                return session.snapshot()
+        session = self.server.get_session(request.get('doc'))
+        if op == 'execute':
+            return session.execute(request['command'])
+        elif op == 'render':
+            with session.lock:
+                return session.snapshot()
+        elif op == 'subscribe':
+            self.sessions.append(session)
+            return session.subscribe(self)
+        elif op == 'unsubscribe':
+            session.unsubscribe(self)
+            return {}
+        elif op == 'save':
+            path = self.server.resolve_path(request['filename'])
+            with session.lock:
+                measure_utils.write_measures(session.doc.measures, session.mpl, path)
+            return {}
+        else:
+            raise ValueError("Unknown op: {}".format(op))
+
+
+class TabServer(SocketServer.ThreadingTCPServer):
+    '''Serves documents to local clients. Documents are created on first
+    'open' and kept until the server shuts down.
+
+    Any local process can connect, so clients may only read and write
+    files under `root`.
+    '''
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, measures_per_line=DEFAULT_MPL, root='.'):
+        SocketServer.ThreadingTCPServer.__init__(self, address, TabRequestHandler)
+        self.mpl = measures_per_line
+        self.root = os.path.realpath(root)
+        self.sessions = {}
+        self.sessions_lock = threading.Lock()
+
+    def resolve_path(self, filename):
+        '''Returns the real path of a client's filename, relative to the
+        root directory.
+
+        Raises:
+            ValueError: if the path is outside the root directory, e.g.
+              through '..' or a symbolic link.
+        '''
+        path = os.path.realpath(os.path.join(self.root, filename))
+        if not os.path.join(path, '').startswith(os.path.join(self.root, '')):
+            raise ValueError("Path is outside the server root: {}".format(filename))
+        return path
+
+    def open_session(self, name, filename=None):
+        with self.sessions_lock:
+            if name not in self.sessions:
+                measures = None
+                if filename:
+                    measures = measure_utils.load_tab_from_ascii(self.resolve_path(filename))
+                self.sessions[name] = DocumentSession(name, measures, self.mpl)
+            return self.sessions[name]
+
+    def get_session(self, name):
+        with self.sessions_lock:
+            if name not in self.sessions:
+                raise ValueError("Document not open: {}".format(name))
+            return self.sessions[name]
+
+
+class TabClient():
+    '''Minimal client for TabServer. Responses are matched to requests by
+    id; events from subscriptions are put on `events`.'''
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT):
+        self.sock = socket.create_connection((host, port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.rfile = self.sock.makefile('r')
+        self.events = Queue.Queue()
+        self.responses = {}
+        self.next_id = 0
+        self.lock = threading.Lock()
+        self.reader = threading.Thread(target=self.read_loop)
+        self.reader.daemon = True
+        self.reader.start()
+
+    def read_loop(self):
+        for line in iter(self.rfile.readline, ''):
+            message = json.loads(line)
+            if 'event' in message:
+                self.events.put(message)
+            else:
+                self.responses.pop(message['id']).put(message)
+
+    def request(self, op, **kwargs):
+        '''Sends a request and waits for its response.
+
+        Raises:
+            ValueError: if the server reports an error.
+        '''
+        with self.lock:
+            self.next_id += 1
+            request_id = self.next_id
+            reply = Queue.Queue()
+            self.responses[request_id] = reply
+            kwargs.update(op=op, id=request_id)
+            self.sock.sendall(json.dumps(kwargs) + '\n')
+        response = reply.get()
+        if not response['ok']:
+            raise ValueError(response['error'])
+        return response
+
+    def close(self):
+        self.sock.shutdown(socket.SHUT_RDWR)
+        self.sock.close()
+
+
+def serve(host='127.0.0.1', port=DEFAULT_PORT, measures_per_line=DEFAULT_MPL, root='.'):
+    server = TabServer((host, port), measures_per_line, root)
+    print("Serving tabs in {} on {}:{}".format(server.root, *server.server_address))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,215 @@
+from measure import Measure
+import measure_utils
+from tab_server import TabClient
+from tab_server import TabRequestHandler
+from tab_server import TabServer
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+class TabServerTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.server = TabServer(('127.0.0.1', 0), measures_per_line=2, root=self.root)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.root)
+
+    def connect(self):
+        client = TabClient(port=self.port)
+        self.clients.append(client)
+        return client
+
+    def testExecuteAndRender(self):
+        client = self.connect()
+        opened = client.request('open', doc='song')
+        self.assertEqual(opened['seq'], 0)
+        self.assertEqual(opened['groups'], ['1\n|-||\n|-||\n|-||\n|-||\n\n'])
+        self.assertEqual(client.request('execute', doc='song', command='1')['seq'], 1)
+        rendered = client.request('render', doc='song')
+        self.assertEqual(rendered['groups'], ['1\n|-1-||\n|---||\n|---||\n|---||\n\n'])
+
+    def testErrors(self):
+        client = self.connect()
+        with self.assertRaises(ValueError):
+            client.request('execute', doc='missing', command='bar')
+        client.request('open', doc='song')
+        with self.assertRaises(ValueError):
+            client.request('execute', doc='song', command='del measure 3')
+        response = client.request('execute', doc='song', command='paste')
+        self.assertEqual(response['message'], "Clipboard empty")
+
+    def testSubscriberReceivesChangedGroups(self):
+        editor = self.connect()
+        viewer = self.connect()
+        editor.request('open', doc='song')
+        for command in ['bar', 'bar', 'bar']:
+            editor.request('execute', doc='song', command=command)
+        snapshot = viewer.request('subscribe', doc='song')
+        self.assertEqual(snapshot['num_groups'], 2)
+
+        editor.request('execute', doc='song', command='edit 1 1 5')
+        event = viewer.events.get(timeout=5)
+        self.assertEqual(event['seq'], 4)
+        self.assertEqual(event['first_group'], 0)
+        self.assertEqual(len(event['groups']), 1)
+        self.assertEqual(event['edit']['measure_range'], [0, 1])
+
+        editor.request('execute', doc='song', command='del measure 4')
+        event = viewer.events.get(timeout=5)
+        self.assertEqual(event['first_group'], 0)
+        self.assertEqual(event['num_groups'], 2)
+        self.assertEqual(event['groups'][1], '3\n|-||\n|-||\n|-||\n|-||\n\n')
+
+    def testDeleteFirstMeasure(self):
+        editor = self.connect()
+        viewer = self.connect()
+        editor.request('open', doc='song')
+        for command in ['1', 'bar', 'bar']:
+            editor.request('execute', doc='song', command=command)
+        viewer.request('subscribe', doc='song')
+        editor.request('execute', doc='song', command='del measure 1')
+        event = viewer.events.get(timeout=5)
+        self.assertEqual(event['first_group'], 0)
+        self.assertEqual(event['num_groups'], 1)
+        self.assertEqual(event['groups'], ['1\n|-|-||\n|-|-||\n|-|-||\n|-|-||\n\n'])
+
+    def testOpenAndSaveInRoot(self):
+        client = self.connect()
+        client.request('open', doc='song')
+        client.request('execute', doc='song', command='1')
+        client.request('save', doc='song', filename='song.txt')
+        opened = client.request('open', doc='copy', filename=os.path.join(self.root, 'song.txt'))
+        self.assertEqual(opened['groups'], client.request('render', doc='song')['groups'])
+
+    def testPathsOutsideRootRejected(self):
+        client = self.connect()
+        os.symlink('/etc', os.path.join(self.root, 'etc'))
+        for filename in ['/etc/passwd', '../outside.txt', 'etc/passwd']:
+            with self.assertRaises(ValueError):
+                client.request('open', doc=filename, filename=filename)
+        client.request('open', doc='song')
+        for filename in ['/tmp/outside.txt', '../outside.txt', 'etc/outside.txt']:
+            with self.assertRaises(ValueError):
+                client.request('save', doc='song', filename=filename)
+        self.assertFalse(os.path.exists(os.path.join(os.path.dirname(self.root), 'outside.txt')))
+
+    def testFailedCommandResyncs(self):
+        editor = self.connect()
+        viewer = self.connect()
+        editor.request('open', doc='song')
+        for command in ['1', '2', '3']:
+            editor.request('execute', doc='song', command=command)
+        viewer.request('subscribe', doc='song')
+        # Deletes a column and then fails on the edit range.
+        with self.assertRaises(ValueError):
+            editor.request('execute', doc='song', command='del 1 1')
+        event = viewer.events.get(timeout=5)
+        self.assertEqual(event['seq'], 4)
+        self.assertIsNone(event['edit'])
+        self.assertEqual(event['first_group'], 0)
+        self.assertEqual(event['groups'], editor.request('render', doc='song')['groups'])
+
+    def testSplitAtLineBoundary(self):
+        editor = self.connect()
+        viewer = self.connect()
+        editor.request('open', doc='song')
+        for command in ['1', '2', 'bar', '3']:
+            editor.request('execute', doc='song', command=command)
+        viewer.request('subscribe', doc='song')
+        editor.request('execute', doc='song', command='barline 2 3')
+        event = viewer.events.get(timeout=5)
+        self.assertEqual(event['first_group'], 0)
+        self.assertEqual(event['groups'][0].splitlines()[1], '|-1-2-|-3|')
+
+    def testSlowSubscriberIsDropped(self):
+        # Each 'insert measure 1' re-renders the whole tab, so the events
+        # soon fill the socket buffers of a client that does not read.
+        measure = Measure()
+        for _ in range(15):
+            measure.append('1 2 3 4')
+        measure_utils.write_measures([measure] * 500, 4, os.path.join(self.root, 'song.txt'))
+        editor = self.connect()
+        editor.request('open', doc='song', filename='song.txt')
+        viewer = self.connect()
+        viewer.request('subscribe', doc='song')
+        session = self.server.sessions['song']
+        outbox_size = TabRequestHandler.outbox_size
+        TabRequestHandler.outbox_size = 4
+        slow = socket.socket()
+        slow.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        try:
+            slow.connect(('127.0.0.1', self.port))
+            slow.sendall(json.dumps({'op': 'subscribe', 'doc': 'song'}) + '\n')
+            while len(session.subscribers) < 2:
+                time.sleep(0.01)
+            num_commands = 0
+            while len(session.subscribers) > 1:
+                self.assertLess(num_commands, 500)
+                editor.request('execute', doc='song', command='insert measure 1')
+                num_commands += 1
+            seqs = [viewer.events.get(timeout=5)['seq'] for _ in range(num_commands)]
+            self.assertEqual(seqs, range(1, num_commands + 1))
+            sys.stderr.write('\nslow subscriber dropped after {} edits\n'.format(num_commands))
+        finally:
+            TabRequestHandler.outbox_size = outbox_size
+            slow.close()
+
+    def testConcurrentClients(self):
+        '''Load generator: several clients append columns to one document
+        while a subscriber follows along.'''
+        num_clients = 8
+        ops_per_client = 50
+        viewer = self.connect()
+        viewer.request('open', doc='song')
+        viewer.request('subscribe', doc='song')
+        latencies = []
+        latencies_lock = threading.Lock()
+
+        def run_client(client):
+            for _ in range(ops_per_client):
+                start = time.time()
+                client.request('execute', doc='song', command='1 2 3 4')
+                with latencies_lock:
+                    latencies.append(time.time() - start)
+
+        clients = [self.connect() for _ in range(num_clients)]
+        threads = [threading.Thread(target=run_client, args=(client,)) for client in clients]
+        start = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - start
+
+        total_ops = num_clients * ops_per_client
+        seqs = [viewer.events.get(timeout=5)['seq'] for _ in range(total_ops)]
+        self.assertEqual(seqs, range(1, total_ops + 1))
+        rendered = viewer.request('render', doc='song')
+        self.assertEqual(rendered['seq'], total_ops)
+        self.assertEqual(rendered['groups'][0].splitlines()[1].count('1'), total_ops)
+
+        latencies.sort()
+        sys.stderr.write('\n{} clients: {:.0f} ops/sec, latency p50 {:.2f} ms, p99 {:.2f} ms\n'.format(
+                num_clients, total_ops / elapsed,
+                latencies[len(latencies) // 2] * 1000,
+                latencies[int(len(latencies) * 0.99)] * 1000))
+
+
+if __name__ == '__main__':
+    unittest.main()
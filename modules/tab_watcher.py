@@ -0,0 +1,137 @@
+'''
+tab_watcher.py
+'''
+from measure import EditDescriptor
+import measure_utils
+import os
+import tab_diff
+
+
+class TabWatcher():
+    '''Watches a tab file for changes by polling its size and mtime.
+
+    The watcher remembers the line groups of the file as of the last poll,
+    so when the file changes only the line groups whose text differs are
+    reparsed and merged into the list of measures.
+    '''
+    def __init__(self, filename):
+        self.filename = filename
+        self.signature = None
+        self.line_groups = []
+        self.group_sizes = []
+
+    def read_signature(self):
+        stat = os.stat(self.filename)
+        return (stat.st_size, stat.st_mtime)
+
+    def read_line_groups(self):
+        with open(self.filename) as f:
+            lines = f.readlines()
+        return [tuple(line.rstrip('\r\n') for line in line_group)
+                for line_group in measure_utils.split_line_groups(lines)]
+
+    def refresh(self):
+        '''Records the current contents of the file without merging them
+        into any measures, e.g. after loading or saving the file.'''
+        self.signature = self.read_signature()
+        self.line_groups = self.read_line_groups()
+        self.group_sizes = [self.count_measures(line_group)
+                            for line_group in self.line_groups]
+
+    def count_measures(self, line_group):
+        '''Counts the measures of a line group from the barlines of its first
+        line, without parsing it.'''
+        return len(filter(None, line_group[0].strip().split('|')))
+
+    def changed(self):
+        return self.read_signature() != self.signature
+
+    def poll(self, measures):
+        '''Checks the file for changes and merges them into `measures`.
+
+        The line groups of the file are diffed against those of the last
+        poll, and only the line groups whose text changed are reparsed.
+
+        Args:
+            measures: the list of Measure objects currently loaded from
+              the file. It is modified in place.
+
+        Returns:
+            A list of EditDescriptors, one for each reparsed line group and
+            one for each run of deleted line groups, or None if the file
+            has not changed.
+
+        Raises:
+            ValueError: if the file changed but the measures it changed
+              have also been edited since it was last loaded or saved, or
+              if the file no longer contains any measures. `measures` is
+              then left unchanged.
+        '''
+        signature = self.read_signature()
+        if signature == self.signature:
+            return None
+        old_groups = self.line_groups
+        old_sizes = self.group_sizes
+        conflict = ValueError("{} changed, but the tab has unsaved changes to the same measures. "
+                              "Use 'load' to reload the file or 'save' to overwrite it.".format(self.filename))
+        new_groups = self.read_line_groups()
+        opcodes = [opcode for opcode in tab_diff.myers_diff(old_groups, new_groups)
+                   if opcode[0] != 'equal']
+        if not opcodes:
+            self.signature = signature
+            return None
+        if len(measures) != sum(old_sizes):
+            raise conflict
+
+        old_starts = [0]
+        for size in old_sizes:
+            old_starts.append(old_starts[-1] + size)
+        reparsed = {}
+        for tag, i1, i2, j1, j2 in opcodes:
+            # The replaced measures must still be as they were in the file.
+            old_measures = []
+            for line_group in old_groups[i1:i2]:
+                old_measures.extend(measure_utils.load_line_group(line_group))
+            if not same_columns(measures[old_starts[i1]:old_starts[i2]], old_measures):
+                raise conflict
+            for j in range(j1, j2):
+                reparsed[j] = measure_utils.load_line_group(new_groups[j])
+
+        new_sizes = list(old_sizes)
+        for tag, i1, i2, j1, j2 in reversed(opcodes):
+            new_sizes[i1:i2] = [len(reparsed[j]) for j in range(j1, j2)]
+        if not sum(new_sizes):
+            raise ValueError("{} no longer contains any measures.".format(self.filename))
+
+        # Splice from the end, so the earlier old measure indices stay valid.
+        for tag, i1, i2, j1, j2 in reversed(opcodes):
+            measures[old_starts[i1]:old_starts[i2]] = [
+                    measure for j in range(j1, j2) for measure in reparsed[j]]
+        self.signature = signature
+        self.line_groups = new_groups
+        self.group_sizes = new_sizes
+
+        new_starts = [0]
+        for size in new_sizes:
+            new_starts.append(new_starts[-1] + size)
+        edits = []
+        for tag, i1, i2, j1, j2 in opcodes:
+            for j in range(j1, j2):
+                if new_sizes[j]:
+                    edits.append(EditDescriptor(EditDescriptor.EditType.UPDATE,
+                            (new_starts[j], new_starts[j + 1]), None, True, True))
+            if j1 == j2 and old_starts[i2] > old_starts[i1]:
+                edit = tab_diff.deleted_measures_edit(measures, new_starts[j1])
+                if edit:
+                    edits.append(edit)
+        return edits or None
+
+
+def same_columns(measures, other_measures):
+    '''Returns True if two lists of measures have the same columns.'''
+    if len(measures) != len(other_measures):
+        return False
+    for measure, other in zip(measures, other_measures):
+        if [column.value for column in measure.columns] != [column.value for column in other.columns]:
+            return False
+    return True
@@ -0,0 +1,129 @@
+from measure import EditDescriptor
+from measure import Measure
+from tab_watcher import TabWatcher
+import measure_utils
+import os
+import tempfile
+import unittest
+
+TAB = '''1
+|-1-|-2-|
+|---|---|
+|---|---|
+|---|---|
+
+3
+|-3-|-4-||
+|---|---||
+|---|---||
+|---|---||
+
+'''
+
+class TabWatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkstemp()[1]
+        self.write(TAB, 1000)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def write(self, contents, mtime):
+        with open(self.path, 'w') as f:
+            f.write(contents)
+        os.utime(self.path, (mtime, mtime))
+
+    def load(self):
+        watcher = TabWatcher(self.path)
+        watcher.refresh()
+        return watcher, measure_utils.load_tab_from_ascii(self.path)
+
+    def testUnchanged(self):
+        watcher, measures = self.load()
+        self.assertIsNone(watcher.poll(measures))
+        self.write(TAB, 2000)
+        self.assertIsNone(watcher.poll(measures))
+        self.assertEqual(len(measures), 4)
+
+    def testChangedLineGroup(self):
+        watcher, measures = self.load()
+        unchanged = measures[0]
+        self.write(TAB.replace('|-3-|-4-||', '|-5-|-6-|-7-||')
+                .replace('|---|---||', '|---|---|---||'), 2000)
+        edits = watcher.poll(measures)
+        self.assertEqual(len(edits), 1)
+        self.assertEqual(edits[0].type, EditDescriptor.EditType.UPDATE)
+        self.assertEqual(edits[0].measure_range, (2, 5))
+        self.assertEqual(len(measures), 5)
+        self.assertIs(measures[0], unchanged)
+        self.assertEqual(measures[4].columns[1].value, ['7', '-', '-', '-'])
+        self.assertIsNone(watcher.poll(measures))
+
+    def testDeletedLineGroup(self):
+        watcher, measures = self.load()
+        self.write(TAB[:TAB.index('3\n')], 2000)
+        edits = watcher.poll(measures)
+        self.assertEqual(len(edits), 1)
+        self.assertEqual(edits[0].type, EditDescriptor.EditType.DELETE)
+        self.assertEqual(edits[0].measure_range, (1, 2))
+        self.assertEqual(len(measures), 2)
+
+    def testOnlyChangedLineGroupsReloaded(self):
+        self.write(TAB + TAB.replace('1\n', '5\n').replace('3\n', '7\n'), 1000)
+        watcher, measures = self.load()
+        unchanged = measures[2:6]
+        self.write(TAB.replace('-1-', '-9-') + TAB.replace('-4-', '-8-'), 2000)
+        edits = watcher.poll(measures)
+        self.assertEqual([edit.measure_range for edit in edits], [(0, 2), (6, 8)])
+        self.assertEqual(measures[2:6], unchanged)
+        self.assertEqual(measures[0].columns[1].value, ['9', '-', '-', '-'])
+        self.assertEqual(measures[7].columns[1].value, ['8', '-', '-', '-'])
+
+    def testEmptiedFile(self):
+        watcher, measures = self.load()
+        self.write('', 2000)
+        with self.assertRaises(ValueError):
+            watcher.poll(measures)
+        self.assertEqual(len(measures), 4)
+
+    def testDivergedMeasures(self):
+        watcher, measures = self.load()
+        measures.pop()
+        self.write(TAB.replace('-4-', '-8-'), 2000)
+        with self.assertRaises(ValueError):
+            watcher.poll(measures)
+        self.assertEqual(len(measures), 3)
+        self.assertEqual(measures[2].columns[1].value, ['3', '-', '-', '-'])
+
+    def testEditedMeasures(self):
+        watcher, measures = self.load()
+        measures[2].update(1, '5')
+        self.write(TAB.replace('-3-', '-6-'), 2000)
+        with self.assertRaises(ValueError):
+            watcher.poll(measures)
+        self.assertEqual(measures[2].columns[1].value, ['5', '-', '-', '-'])
+
+    def testShiftedMeasures(self):
+        watcher, measures = self.load()
+        # Same number of measures, but measure 2 is now where measure 3 was.
+        measures.insert(1, Measure())
+        measures.pop(3)
+        self.write(TAB.replace('-3-', '-6-'), 2000)
+        with self.assertRaises(ValueError):
+            watcher.poll(measures)
+
+    def testEditsOutsideChangedLineGroupsKept(self):
+        watcher, measures = self.load()
+        measures[0].update(1, '5')
+        self.write(TAB.replace('-3-', '-6-'), 2000)
+        watcher.poll(measures)
+        self.assertEqual(measures[0].columns[1].value, ['5', '-', '-', '-'])
+        self.assertEqual(measures[2].columns[1].value, ['6', '-', '-', '-'])
+
+    def testRefreshCountsMeasures(self):
+        watcher, measures = self.load()
+        self.assertEqual(watcher.group_sizes, [2, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
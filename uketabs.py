@@ -1,10 +1,11 @@
-import copy
-from modules.measure import Measure
-from modules.measure import EditDescriptor
+import argparse
+from modules.document import Document
+from modules.layout import Layout
+from modules.tab_cache import TabCache
 from modules import measure_utils
-import sys
-
-EditType = EditDescriptor.EditType
+from modules import tab_diff
+from modules import tab_server
+from modules.tab_watcher import TabWatcher
 
 def usage():
     print('''
@@ -17,19 +18,44 @@ def usage():
         exit program
     load [filename]
         load ascii tab file that has been created with this editor
+        files that have not changed since they were last loaded are
+        not parsed again
+    cache
+        show how often loads were served from the cache
     save [filename]
         save tab as plain text file
         if filename unspecified, overwrites last saved file
+    export [filename] [processes]
+        save tab using several processes, for very large tabs
+        the file is the same as with save
     new
         create blank document
+    diff [filename]
+        compare the current tab with a tab file and display the file
+        with its differences highlighted
     show
         display current tab
     mpl [measures per line]
         adjust measures displayed per line (default = 4)
+    width [characters per line / auto]
+        fit as many measures on each line as the width allows
+        auto uses the width of the terminal
+    cpl [columns per line]
+        fit as many measures on each line as the number of columns allows
+    annotate
+        toggle chord annotation (default = OFF)
+        annotation: chord columns are named above the staff
+    chords
+        list the chord progression of the tab
     autospace
         toggle autospace mode (default = ON)
         autospace mode: a blank column is automatically appended whenever
         a non-blank column is added
+    watch
+        toggle watch mode (default = OFF)
+        watch mode: changes made to the loaded file by other programs are
+        merged into the tab before each command. only the changed lines
+        of music are reloaded
     bar / b
         append a new measure
     barline [measure #] [column #]
@@ -80,53 +106,140 @@ def usage():
     ''')
 
 
-def main():
+def main(width=None, cache_dir=None):
     # Settings
-    mpl = 4  # Measures per line
+    if width:
+        layout = Layout(width=width)
+    else:
+        layout = Layout()
     auto_save = "my_song.txt"
-    autospace = True
+    annotate = False
+
+    # Parsed tabs, so that reloading an unchanged file is cheap
+    tab_cache = TabCache(cache_dir=cache_dir)
 
-    # Initialize list of measures
-    measures = [Measure()]
+    # The tab being edited, with its clipboard and last edit
+    doc = Document()
 
-    # clipboard for copy/paste
-    clipboard = []
+    # Watches the loaded file for changes when watch mode is on
+    watcher = None
 
-    # Last edit
-    last_edit = EditDescriptor(EditType.INSERT, 0, None, True, True)
+    def show():
+        '''Re-flows the lines changed by the last edit and prints the tab.'''
+        layout.update(doc.measures, doc.last_edit)
+        measure_utils.write_measures(doc.measures, None, None, doc.last_edit, layout.breaks,
+                chord_names=annotate)
 
-    measure_utils.write_measures(measures, mpl, last_edit=last_edit)
+    show()
     while True:
         command = raw_input(">> ")
+        if watcher:
+            try:
+                watch_edits = watcher.poll(doc.measures)
+                if watch_edits:
+                    doc.last_edit = watch_edits
+                    print("Reloaded changes from {}".format(watcher.filename))
+                    show()
+            except Exception as e:
+                # The tab may have been partly reloaded, so re-flow it all.
+                layout.update(doc.measures)
+                watcher = None
+                print("Error watching file: {}".format(e))
+                print("watch mode turned OFF")
+            if not doc.measures:
+                doc.reset()
+                show()
         if command in ["exit", "quit", "q"]:
             break
         elif command == "help":
             usage()
         elif command == "show":
-            measure_utils.write_measures(measures, mpl, last_edit=last_edit)
+            show()
         elif command.startswith("mpl"):
             command = command.split()
             try:
                 if len(command) < 2:
                     raise ValueError("mpl command requires integer argument.")
-                new_mpl = int(command[1])
-                mpl = new_mpl
-                measure_utils.write_measures(measures, mpl, last_edit=last_edit)
+                layout.set_mode(measures_per_line=int(command[1]))
+                show()
+            except Exception as e:
+                print("Parse error: {}".format(e))
+        elif command.startswith("width"):
+            command = command.split()
+            try:
+                if len(command) < 2:
+                    raise ValueError("width command requires integer or 'auto' argument.")
+                layout.set_mode(width=command[1] if command[1] == 'auto' else int(command[1]))
+                show()
+                print("Layout: {}".format(layout.describe()))
+            except Exception as e:
+                print("Parse error: {}".format(e))
+        elif command.startswith("cpl"):
+            command = command.split()
+            try:
+                if len(command) < 2:
+                    raise ValueError("cpl command requires integer argument.")
+                layout.set_mode(columns_per_line=int(command[1]))
+                show()
             except Exception as e:
                 print("Parse error: {}".format(e))
         elif command == "autospace":
-            autospace = not autospace
-            print("autospace mode turned {}".format("ON" if autospace else "OFF"))
+            doc.autospace = not doc.autospace
+            print("autospace mode turned {}".format("ON" if doc.autospace else "OFF"))
+        elif command == "annotate":
+            annotate = not annotate
+            print("chord annotation turned {}".format("ON" if annotate else "OFF"))
+        elif command == "chords":
+            progression = measure_utils.chord_progression(doc.measures)
+            if not progression:
+                print("No chords found")
+            measure_line = []
+            for i, (measure_num, name) in enumerate(progression):
+                measure_line.append(name)
+                if i == len(progression) - 1 or progression[i + 1][0] != measure_num:
+                    print("{}: {}".format(measure_num + 1, ' '.join(measure_line)))
+                    measure_line = []
+        elif command == "watch":
+            try:
+                if watcher:
+                    watcher = None
+                else:
+                    new_watcher = TabWatcher(auto_save)
+                    new_watcher.refresh()
+                    watcher = new_watcher
+                print("watch mode turned {}".format("ON" if watcher else "OFF"))
+            except Exception as e:
+                print("Error watching file: {}".format(e))
+        elif command.startswith("diff"):
+            command = command.split()
+            try:
+                if len(command) < 2:
+                    raise ValueError("diff requires filename argument.")
+                other = tab_cache.load(command[1])
+                edits = tab_diff.diff_tabs(doc.measures, other)
+                other_layout = Layout(layout.measures_per_line, layout.width, layout.columns_per_line)
+                other_layout.update(other)
+                measure_utils.write_measures(other, None, last_edit=edits, breaks=other_layout.breaks,
+                        chord_names=annotate)
+                print(tab_diff.summarize(edits))
+            except Exception as e:
+                print("Error comparing file: {}".format(e))
+        elif command == "cache":
+            stats = tab_cache.stats()
+            print("{entries} tabs cached ({bytes} bytes): {hits} hits, {disk_hits} disk hits, "
+                  "{misses} misses".format(**stats))
         elif command.startswith("load"):
             command = command.split()
             try:
                 if len(command) < 2:
                     raise ValueError("load requires filename argument.")
                 filename = command[1]
-                measures = measure_utils.load_tab_from_ascii(filename)
-                last_edit = None
-                measure_utils.write_measures(measures, mpl, last_edit=last_edit)
+                doc.reset(tab_cache.load(filename))
+                show()
                 auto_save = filename
+                if watcher:
+                    watcher = TabWatcher(filename)
+                    watcher.refresh()
             except Exception as e:
                 print("Error loading file: {}".format(e.message))
         elif command.startswith("save"):
@@ -136,211 +249,61 @@ def main():
             else:
                 filename = auto_save
             try:
-                measure_utils.write_measures(measures, mpl, filename)
+                # Saved tabs never include chord annotation.
+                layout.update(doc.measures, doc.last_edit)
+                measure_utils.write_measures(doc.measures, None, filename, breaks=layout.breaks)
                 print("Successfully saved to {}".format(filename))
                 auto_save = filename
+                if watcher:
+                    watcher = TabWatcher(filename)
+                    watcher.refresh()
             except Exception as e:
                 print("Error saving file: {}".format(e.message))
-        elif command == "new":
-            measures = [Measure()]
-            last_edit = EditDescriptor(EditType.INSERT, 0, None, True, True)
-            measure_utils.write_measures(measures, mpl, last_edit=last_edit)
-        elif command in ["bar", "b"]:
-            measures.append(Measure())
-            last_edit = EditDescriptor(EditType.INSERT, len(measures) - 1, None, True, False)
-            measure_utils.write_measures(measures, mpl, last_edit=last_edit)
-        elif command.startswith("barline"):
-            command = command.split()
-            try:
-                if len(command) < 3:
-                    raise ValueError("barline command must specify measure number and column index.")
-                measure_num = int(command[1])-1
-                if measure_num < 0 or measure_num > len(measures) - 1:
-                    raise ValueError("Measure number out of range.")
-                col_num = int(command[2])-1
-                split = measure_utils.split_measure(measures[measure_num], col_num)
-                measures[measure_num] = split[0]
-                split[1].insert(0, '')
-                measures.insert(measure_num+1, split[1])
-                last_edit = EditDescriptor(EditType.INSERT, measure_num + 1, [(0, 1)], True, False)
-                measure_utils.write_measures(measures, mpl, last_edit=last_edit)
-            except Exception as e:
-                print("Error inserting barline: {}".format(e.message))
-        elif command.startswith("del barline"):
-            command = command.split()
-            try:
-                if len(command) < 3:
-                    raise ValueError("del barline command must specify measure number.")
-                measure_num = int(command[2])-1
-                if measure_num == 0:
-                    raise ValueError("Cannot remove initial barline.")
-                elif measure_num < 0 or measure_num > len(measures) - 1:
-                    raise ValueError("Measure number out of range.")
-                col_num = len(measures[measure_num - 1].columns) - 1
-                deletes_last_col = len(measures[measure_num].columns) == 1
-                merged = measure_utils.merge_measures(measures[measure_num - 1], measures[measure_num])
-                measures[measure_num - 1] = merged
-                measures.pop(measure_num)
-                last_edit = EditDescriptor(EditType.DELETE, measure_num - 1, [(col_num, col_num + 2)], False, deletes_last_col)
-                measure_utils.write_measures(measures, mpl, last_edit=last_edit)
-            except Exception as e:
-                print("Error deleting barline: {}".format(e.message))
-        elif command in ["del", "d"]:
-            try:
-                if len(measures[-1].columns) <= 1 and len(measures) > 1:
-                    measures.pop()
-                elif len(measures[-1].columns) > 1:
-                    measures[-1].delete()
-                    if autospace and len(measures[-1].columns) > 1:
-                        measures[-1].delete()
-                cols = len(measures[-1].columns)
-                last_edit = EditDescriptor(EditType.DELETE, len(measures) - 1, [(cols - 1, cols)], False, True)
-                measure_utils.write_measures(measures, mpl, last_edit=last_edit)
-            except Exception as e:
-                print("Error removing last entry: {}".format(e.message))
-        elif command.startswith("insert measure"):
-            command = command.split()
-            try:
-                if len(command) < 3:
-                    raise ValueError("insert measure requires index argument.")
-                measure_num = int(command[2])-1
-                if measure_num < 0 or measure_num > len(measures) - 1:
-                    raise ValueError("Measure number out of range.")
-                measures.insert(measure_num, Measure())
-                last_edit = EditDescriptor(EditType.INSERT, measure_num, None, True, False)
-                measure_utils.write_measures(measures, mpl, last_edit=last_edit)
-            except Exception as e:
-                print("Error inserting measure: {}".format(e.message))
-        elif command.startswith("del measure") or command.startswith("delete measure"):
+        elif command.startswith("export"):
             command = command.split()
             try:
-                if len(command) < 3:
-                    raise ValueError("delete measure requires measure number argument.")
-                measure_num = int(command[2])-1
-                if measure_num < 0 or measure_num > len(measures) - 1:
-                    raise ValueError("Measure number out of range.")
-                if len(measures) == 1:
-                    raise ValueError("Cannot delete the only measure.")
-                measures.pop(measure_num)
-                cols = len(measures[measure_num-1].columns)
-                last_edit = EditDescriptor(EditType.DELETE, measure_num - 1, [(cols - 1, cols)], False, True)
-                measure_utils.write_measures(measures, mpl, last_edit=last_edit)
-            except Exception as e:
-                print("Error deleting measure: {}".format(e.message))
-        elif command.startswith("copy measure"):
-            command = command.split()
-            try:
-                if len(command) < 3:
-                    raise ValueError("copy measure requires measure number argument.")
-                measure_num = int(command[2])-1
-                if measure_num < 0 or measure_num > len(measures) - 1:
-                    raise ValueError("Measure number out of range.")
-                clipboard = [copy.deepcopy(measures[measure_num])]
-                print("Copied measure {}. Use 'paste' or 'paste insert'.".format(measure_num+1))
-            except Exception as e:
-                print("Error copying measure: {}".format(e.message))
-        elif command.startswith("copy range"):
-            command = command.split()
-            try:
-                if len(command) < 4:
-                    raise ValueError("copy range requires begin and end range argument.")
-                begin_range = int(command[2])-1
-                end_range = int(command[3])
-                if begin_range < 0 or begin_range > len(measures) - 1:
-                    raise ValueError("Range begins out of range.")
-                if end_range < 0 or end_range > len(measures):
-                    raise ValueError("Range ends out of range.")
-                if begin_range + 1 > end_range:
-                    raise ValueError("Range specifiers out of order.")
-                clipboard = copy.deepcopy(measures[begin_range:end_range])
-                print("Copied measures {}-{}. Use 'paste' or 'paste insert'.".format(begin_range+1, end_range))
-            except Exception as e:
-                print("Error copying measures: {}".format(e.message))
-        elif command.startswith("paste insert"):
-            command = command.split()
-            try:
-                if len(command) < 3:
-                    raise ValueError("paste insert requires index argument.")
-                if len(clipboard) > 0:
-                    measure_num = int(command[2])-1
-                    if measure_num < 0 or measure_num > len(measures) - 1:
-                        raise ValueError("Measure number out of range.")
-                    measures[measure_num:measure_num] = copy.deepcopy(clipboard)
-                    m_range = (measure_num, measure_num + len(clipboard))
-                    last_edit = EditDescriptor(EditType.INSERT, m_range, None, True, False)
-                    measure_utils.write_measures(measures, mpl, last_edit=last_edit)
-                else:
-                    print("Clipboard empty")
+                if len(command) < 2:
+                    raise ValueError("export requires filename argument.")
+                filename = command[1]
+                processes = int(command[2]) if len(command) > 2 else None
+                layout.update(doc.measures, doc.last_edit)
+                measure_utils.export_measures(doc.measures, None, filename, layout.breaks,
+                        processes=processes)
+                print("Successfully exported to {}".format(filename))
             except Exception as e:
-                print("Error pasting measures: {}".format(e.message))
-        elif command == "paste":
+                print("Error exporting file: {}".format(e))
+        elif command == "new":
+            doc.reset()
+            show()
+        else:
             try:
-                if len(clipboard) > 0:
-                    measures.extend(copy.deepcopy(clipboard))
-                    m_range = (len(measures) - len(clipboard), len(measures))
-                    last_edit = EditDescriptor(EditType.INSERT, m_range, None, True, False)
-                    measure_utils.write_measures(measures, mpl, last_edit=last_edit)
+                message = doc.execute(command)
+                if message:
+                    print(message)
                 else:
-                    print("Clipboard empty")
-            except Exception as e:
-                print("Error pasting measures: {}".format(e.message))
-        elif command.startswith("edit"):
-            command = command.split()
-            try:
-                if len(command) < 3:
-                    raise ValueError("edit command requires measure number and column number.")
-                measure_num = int(command[1])-1
-                if measure_num < 0 or measure_num > len(measures) - 1:
-                    raise ValueError("Measure number out of range")
-                col_num = int(command[2])-1
-                col = ' '.join(command[3:])
-                measures[measure_num].update(col_num, col)
-                last_edit = EditDescriptor(EditType.UPDATE, measure_num, [(col_num, col_num+1)])
-                measure_utils.write_measures(measures, mpl, last_edit=last_edit)
-            except Exception as e:
-                print("Error editing column: {}".format(e.message))
-        elif command.startswith("insert"):
-            command = command.split()
-            try:
-                if len(command) < 3:
-                    raise ValueError("insert command requires measure number and column index.")
-                measure_num = int(command[1])-1
-                if measure_num < 0 or measure_num > len(measures) - 1:
-                    raise ValueError("Measure number out of range")
-                col_num = int(command[2])-1
-                col = ' '.join(command[3:])
-                measures[measure_num].insert(col_num, col)
-                last_edit = EditDescriptor(EditType.INSERT, measure_num, [(col_num, col_num+1)])
-                measure_utils.write_measures(measures, mpl, last_edit=last_edit)
-            except Exception as e:
-                print("Error inserting column: {}".format(e.message))
-        elif command.startswith("del") or command.startswith("delete"):
-            command = command.split()
-            try:
-                if len(command) < 3:
-                    raise ValueError("delete command requires measure number and column index.")
-                measure_num = int(command[1])-1
-                if measure_num < 0 or measure_num > len(measures) - 1:
-                    raise ValueError("Measure number out of range")
-                col_num = int(command[2])-1
-                is_last_col = col_num == len(measures[measure_num].columns) - 1
-                is_first_col = col_num == 0
-                measures[measure_num].delete(col_num)
-                last_edit = EditDescriptor(EditType.DELETE, measure_num, [(col_num-1, col_num+1)], is_first_col, is_last_col)
-                measure_utils.write_measures(measures, mpl, last_edit=last_edit)
-            except Exception as e:
-                print("Error deleting column: {}".format(e.message))
-        else:
-            #try:
-            measures[-1].append(command)
-            cols = len(measures[-1].columns)
-            last_edit = EditDescriptor(EditType.INSERT, len(measures) - 1, [(cols-1, cols)])
-            if autospace and command != '' and set(command.split()) != set(['-']):
-                measures[-1].append('')
-                last_edit = EditDescriptor(EditType.INSERT, len(measures) - 1, [(cols-1, cols+1)])
-            measure_utils.write_measures(measures, mpl, last_edit=last_edit)
-            #except Exception as e:
-            #    print("Error adding column: {}".format(e.message))
+                    show()
+            except ValueError as e:
+                # A failed command may still have changed the measures.
+                layout.update(doc.measures)
+                print(e)
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="A simple command line ukulele tab editor")
+    parser.add_argument("--width", default=None,
+            help="characters per line of music, or 'auto' for the terminal width")
+    parser.add_argument("--cache-dir", default=None,
+            help="directory to keep parsed tabs in between runs")
+    parser.add_argument("--serve", action="store_true",
+            help="run a local tab server instead of the interactive editor")
+    parser.add_argument("--port", type=int, default=tab_server.DEFAULT_PORT,
+            help="port for --serve (default = {})".format(tab_server.DEFAULT_PORT))
+    parser.add_argument("--root", default=".",
+            help="directory that --serve clients may open and save tabs in (default = current directory)")
+    args = parser.parse_args()
+    if args.serve:
+        tab_server.serve(port=args.port, root=args.root)
+    else:
+        width = args.width
+        if width and width != 'auto':
+            width = int(width)
+        main(width, args.cache_dir)